@@ -0,0 +1,139 @@
+import asyncio
+from array import array
+import roblox
+
+# Alt-ring discovery around a seed account. The friend lists of the seed and
+# its friends build a compact graph; the most connected candidates then get
+# their groups and risk features fetched, and are ranked by the neighbours
+# (friends and groups) they share with the seed plus their risk score.
+# Shared friends are the seed's friends, so expanding past them cannot change
+# a score: depth only decides whether friends of friends become candidates.
+DEFAULT_DEPTH = 2
+MAX_DEPTH = 2
+NODE_BUDGET = 500  # users discovered before the crawl stops expanding
+FETCH_BUDGET = 100  # friend-list fetches per crawl, the seed's included
+FETCH_CONCURRENCY = 8
+SHORTLIST = 25  # candidates that get groups and risk features fetched
+RISK_WEIGHT = 2  # cluster score points per risk score point
+
+class ClusterGraph:
+    # Users and groups share one dense integer node space. Keys are Roblox ids,
+    # with groups stored as -group_id so the two kinds cannot collide.
+    def __init__(self):
+        self.index = {}  # key -> node
+        self.keys = array("q")  # node -> key
+        self.depth = array("b")  # node -> BFS depth, -1 for groups
+        self.expanded = array("b")  # node -> 1 once its friend list is linked
+        self.neighbors = []  # node -> array("i") of adjacent nodes
+        self.edges = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def node(self, key, depth):
+        node = self.index.get(key)
+        if node is None:
+            node = len(self.keys)
+            self.index[key] = node
+            self.keys.append(key)
+            self.depth.append(depth)
+            self.expanded.append(0)
+            self.neighbors.append(array("i"))
+        return node
+
+    def link(self, a, b):
+        self.neighbors[a].append(b)
+        self.neighbors[b].append(a)
+        self.edges += 1
+
+    def users(self):
+        return [node for node in range(len(self.keys)) if self.depth[node] >= 0]
+
+    def shared(self, a, b):
+        # (shared friends, shared groups) between two user nodes
+        common = set(self.neighbors[a]).intersection(self.neighbors[b])
+        groups = sum(1 for node in common if self.depth[node] < 0)
+        return len(common) - groups, groups
+
+def add_friends(graph, node, friend_ids, node_budget, max_depth):
+    # Friendship is mutual, so a friend that was already expanded linked this pair itself
+    depth = graph.depth[node] + 1
+    for friend_id in friend_ids:
+        friend = graph.index.get(friend_id)
+        if friend is None:
+            if depth > max_depth or len(graph) >= node_budget:
+                continue
+            friend = graph.node(friend_id, depth)
+        elif graph.expanded[friend] or friend == node:
+            continue
+        graph.link(node, friend)
+    graph.expanded[node] = 1
+
+async def crawl(seed_id, depth, node_budget, fetch_budget=FETCH_BUDGET):
+    graph = ClusterGraph()
+    graph.node(seed_id, 0)
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def expand(node):
+        async with semaphore:
+            friend_ids = await roblox.get_user_friend_ids(graph.keys[node])
+        if isinstance(friend_ids, str):
+            if node == 0:
+                raise roblox.RobloxAPIError(friend_ids)
+            print(f"Alt cluster friends error for user {graph.keys[node]}: {friend_ids}")  # Log for debugging
+            return
+        add_friends(graph, node, friend_ids, node_budget, depth)
+
+    await expand(0)
+    # The seed's friends are always expanded, as that links them to each other;
+    # with depth 1 this adds no nodes, so only the fetch budget applies
+    frontier = graph.users()[1:fetch_budget]
+    for i in range(0, len(frontier), FETCH_CONCURRENCY):
+        if depth > 1 and len(graph) >= node_budget:
+            break
+        await asyncio.gather(*(expand(node) for node in frontier[i:i + FETCH_CONCURRENCY]))
+    return graph
+
+async def add_groups(graph, nodes):
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch(node):
+        async with semaphore:
+            return await roblox.get_user_groups(graph.keys[node])
+
+    results = await asyncio.gather(*(fetch(node) for node in nodes))
+    for node, groups in zip(nodes, results):
+        if isinstance(groups, str):
+            continue
+        for group in groups:
+            graph.link(node, graph.node(-group["id"], -1))
+
+async def find_cluster(seed_id, depth=DEFAULT_DEPTH, node_budget=NODE_BUDGET):
+    # Returns {"candidates": [...], "nodes", "edges", "groups"} or an error string
+    try:
+        graph = await crawl(seed_id, min(depth, MAX_DEPTH), node_budget)
+    except Exception as e:
+        print(f"Alt cluster crawl error for user {seed_id}: {e}")  # Log for debugging
+        return "Unable to retrieve friend data. Please check the User ID."
+    candidates = graph.users()[1:]
+    # Shortlist on shared friends alone, then add groups for the seed and the shortlist
+    candidates.sort(key=lambda node: graph.shared(0, node)[0], reverse=True)
+    shortlist = candidates[:SHORTLIST]
+    if not shortlist:
+        return {"candidates": [], "nodes": len(graph), "edges": graph.edges, "groups": 0}
+    await add_groups(graph, [0] + shortlist)
+    try:
+        users = await roblox.get_users_batch([graph.keys[node] for node in shortlist])
+    except Exception as e:
+        print(f"Alt cluster lookup error for user {seed_id}: {e}")  # Log for debugging
+        return "Unable to resolve the candidate accounts."
+    shortlist = [node for node in shortlist if graph.keys[node] in users]
+    records = await asyncio.gather(*(roblox.scan_user(graph.keys[node], users[graph.keys[node]]["name"]) for node in shortlist))
+    roblox.apply_risk(records)
+    for node, record in zip(shortlist, records):
+        record["shared_friends"], record["shared_groups"] = graph.shared(0, node)
+        record["depth"] = graph.depth[node]
+        record["cluster_score"] = record["shared_friends"] + record["shared_groups"] + RISK_WEIGHT * record.get("risk_score", 0)
+    records.sort(key=lambda r: r["cluster_score"], reverse=True)
+    user_count = len(graph.users())
+    return {"candidates": records, "nodes": user_count, "edges": graph.edges, "groups": len(graph) - user_count}
@@ -0,0 +1,133 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+# Local stand-in for the Roblox web APIs used by the bot. Data is generated
+# deterministically from ids, so runs are repeatable. Routes are prefixed with
+# the real host name, matching roblox.API_BASE_OVERRIDE.
+
+class FakeRoblox:
+    def __init__(self, group_size=5000, group_overlap=0.1, badges=300, friends=200, user_groups=50,
+                 latency_ms=0.0, rate_429=0.0, retry_after=0.05, seed=1):
+        self.group_size = group_size
+        self.group_overlap = group_overlap
+        self.badges = badges
+        self.friends = friends
+        self.user_groups = user_groups
+        self.latency = latency_ms / 1000
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self.epoch = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+    # --- Deterministic data ---
+
+    def group_member_ids(self, group_id):
+        # Adjacent group ids overlap by group_overlap of their members
+        stride = max(int(self.group_size * (1 - self.group_overlap)), 1)
+        start = (group_id - 1) * stride + 1
+        return range(start, start + self.group_size)
+
+    def connection_ids(self, user_id, count):
+        # Users with nearby ids share most of their connections
+        start = (user_id // 10) * 1000 + 10_000_000
+        return range(start + user_id % 10, start + user_id % 10 + count)
+
+    def iso(self, days):
+        return (self.epoch + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def paginate(self, request, items):
+        limit = int(request.query.get("limit", 100))
+        offset = int(request.query.get("cursor") or 0)
+        end = offset + limit
+        return items[offset:end], (str(end) if end < len(items) else None)
+
+    # --- Middleware ---
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_429 and self.random.random() < self.rate_429:
+            self.throttled += 1
+            return web.json_response({"errors": [{"code": 0, "message": "TooManyRequests"}]}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+        return await handler(request)
+
+    # --- Handlers ---
+
+    async def handle_group_users(self, request):
+        group_id = int(request.match_info["group_id"])
+        ids, cursor = self.paginate(request, self.group_member_ids(group_id))
+        data = [{"user": {"userId": i, "username": f"User{i}", "displayName": f"User{i}"},
+                 "role": {"id": i % 5, "name": f"Rank {i % 5}", "rank": (i % 5) * 50 + 1}} for i in ids]
+        return web.json_response({"previousPageCursor": None, "nextPageCursor": cursor, "data": data})
+
+    async def handle_group_info(self, request):
+        group_id = int(request.match_info["group_id"])
+        return web.json_response({"id": group_id, "name": f"Group {group_id}", "memberCount": self.group_size})
+
+    async def handle_user_groups(self, request):
+        user_id = int(request.match_info["user_id"])
+        base = user_id % 7 + 1
+        data = [{"group": {"id": g, "name": f"Group {g}", "memberCount": self.group_size},
+                 "role": {"id": 1, "name": "Member", "rank": 1}} for g in range(base, base + self.user_groups)]
+        return web.json_response({"data": data})
+
+    def user_record(self, user_id):
+        return {"id": user_id, "name": f"User{user_id}", "displayName": f"User{user_id}",
+                "description": "Benchmark account", "created": self.iso(user_id % 3000), "hasVerifiedBadge": False}
+
+    async def handle_user(self, request):
+        return web.json_response(self.user_record(int(request.match_info["user_id"])))
+
+    async def handle_users_batch(self, request):
+        payload = await request.json()
+        return web.json_response({"data": [self.user_record(i) for i in payload.get("userIds", [])]})
+
+    async def handle_count(self, request):
+        user_id = int(request.match_info["user_id"])
+        kind = request.match_info["kind"]
+        counts = {"friends": self.friends, "followers": self.friends * 3, "followings": self.friends // 2}
+        return web.json_response({"count": counts.get(kind, 0) + user_id % 5})
+
+    async def handle_connections(self, request):
+        user_id = int(request.match_info["user_id"])
+        count = self.friends if request.match_info["kind"] == "friends" else self.friends // 2
+        ids, cursor = self.paginate(request, self.connection_ids(user_id, count))
+        data = [{"id": i, "name": f"User{i}", "displayName": f"User{i}"} for i in ids]
+        return web.json_response({"nextPageCursor": cursor, "data": data})
+
+    async def handle_badges(self, request):
+        user_id = int(request.match_info["user_id"])
+        ids, cursor = self.paginate(request, range(self.badges))
+        data = [{"id": user_id * 100_000 + i, "name": f"Badge {i}", "awardedDate": self.iso(i * 3 + user_id % 10)} for i in ids]
+        return web.json_response({"nextPageCursor": cursor, "data": data})
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/groups.roblox.com/v1/groups/{group_id}/users", self.handle_group_users)
+        app.router.add_get("/groups.roblox.com/v1/groups/{group_id}", self.handle_group_info)
+        app.router.add_get("/groups.roblox.com/v1/users/{user_id}/groups", self.handle_user_groups)
+        app.router.add_get("/users.roblox.com/v1/users/{user_id}", self.handle_user)
+        app.router.add_post("/users.roblox.com/v1/users", self.handle_users_batch)
+        app.router.add_get("/friends.roblox.com/v1/users/{user_id}/{kind}/count", self.handle_count)
+        app.router.add_get("/friends.roblox.com/v1/users/{user_id}/{kind}", self.handle_connections)
+        app.router.add_get("/badges.roblox.com/v1/users/{user_id}/badges", self.handle_badges)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        # Returns the base URL to use as roblox.API_BASE_OVERRIDE
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
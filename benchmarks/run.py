@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from benchmarks.fake_roblox import FakeRoblox
+
+# Offline benchmarks for the Roblox fetchers and command bodies, run against
+# the local FakeRoblox server. Usage: python -m benchmarks.run [--help]
+
+# --- Stubbed Discord interaction for command bodies ---
+
+class StubMessage:
+    async def edit(self, **kwargs):
+        pass
+
+class StubFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, *args, wait=False, **kwargs):
+        self.sent.append(kwargs)
+        return StubMessage()
+
+class StubResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+class StubInteraction:
+    def __init__(self):
+        self.response = StubResponse()
+        self.followup = StubFollowup()
+        self.extras = {}
+        self.user = SimpleNamespace(id=0)
+        self.guild = None
+        self.command = None
+
+# --- Benchmarks: each takes the op index and performs one operation ---
+
+def make_benchmarks():
+    import roblox
+
+    async def group_members(i):
+        result = await roblox.get_group_members_with_ranks(i + 1)
+        assert not isinstance(result, str), result
+
+    async def user_profile(i):
+        result = await roblox.get_user_profile(1000 + i)
+        assert not isinstance(result, str), result
+
+    async def user_badges(i):
+        result = await roblox.get_user_badges_full(1000 + i)
+        assert not isinstance(result, str), result
+
+    async def compare_users(i):
+        result = await roblox.compare_users(1000 + i, 1001 + i)
+        assert not isinstance(result, str), result
+
+    async def compare_threat(i):
+        result = await roblox.compare_users(1000 + i, 1001 + i, threat_only=True)
+        assert not isinstance(result, str), result
+
+    async def group_intersect_live(i):
+        result = await roblox.intersect_group_members(2 * i + 1, 2 * i + 2)
+        assert not isinstance(result, str), result
+
+    async def alt_cluster(i):
+        import alt_cluster
+        result = await alt_cluster.find_cluster(1000 + i)
+        assert not isinstance(result, str), result
+
+    benchmarks = {
+        "group_members": group_members,
+        "user_profile": user_profile,
+        "user_badges": user_badges,
+        "compare_users": compare_users,
+        "compare_threat": compare_threat,
+        "group_intersect_live": group_intersect_live,
+        "alt_cluster": alt_cluster,
+    }
+    try:
+        import main
+    except ImportError as e:
+        print(f"Skipping command benchmarks ({e})")
+        return benchmarks
+    import roster_store
+
+    async def cmd_group_check(i):
+        group_id_1, group_id_2 = 2 * i + 1, 2 * i + 2
+        await main.group_check.callback(StubInteraction(), group_id_1, group_id_2)
+        await roster_store.untrack_group(group_id_1)
+        await roster_store.untrack_group(group_id_2)
+
+    async def cmd_badge_info(i):
+        await main.badge_info.callback(StubInteraction(), 1000 + i)
+
+    async def cmd_group_matrix(i):
+        group_ids = [5 * i + n for n in range(1, 6)]
+        await main.group_matrix.callback(StubInteraction(), " ".join(map(str, group_ids)), 2)
+        for group_id in group_ids:
+            await roster_store.untrack_group(group_id)
+
+    benchmarks["cmd_group_check"] = cmd_group_check
+    benchmarks["cmd_badge_info"] = cmd_badge_info
+    benchmarks["cmd_group_matrix"] = cmd_group_matrix
+    return benchmarks
+
+# --- Runner ---
+
+def clear_caches():
+    import charts
+    import roblox
+    roblox.cache.clear()
+    charts.chart_cache.clear()
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+async def run_benchmark(fn, iterations, concurrency, warm):
+    if not warm:
+        clear_caches()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await fn(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    wall = time.perf_counter() - started
+    # One extra cold op under tracemalloc for the memory figure
+    if not warm:
+        clear_caches()
+    tracemalloc.start()
+    await fn(iterations)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ops": iterations,
+        "throughput": round(iterations / wall, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_kb"):
+            if base[metric] and result[metric] > base[metric] * tolerance:
+                regressions.append(f"{name}.{metric}: {base[metric]} -> {result[metric]}")
+    return regressions
+
+async def main(args):
+    import charts
+    import ratelimit
+    import roblox
+    server = FakeRoblox(group_size=args.group_size, group_overlap=args.overlap, badges=args.badges,
+                        friends=args.friends, user_groups=args.user_groups,
+                        latency_ms=args.latency_ms, rate_429=args.rate_429)
+    roblox.API_BASE_OVERRIDE = await server.start()
+    if not args.real_limits:
+        # Measure the code, not Roblox's rate limits
+        ratelimit.HOST_LIMITS = {}
+        ratelimit.DEFAULT_LIMIT = (1_000_000, 1_000_000)
+    benchmarks = make_benchmarks()
+    selected = args.only or list(benchmarks)
+    results = {}
+    try:
+        print(f"{'benchmark':<22}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>12}")
+        for name in selected:
+            result = await run_benchmark(benchmarks[name], args.iterations, args.concurrency, args.warm)
+            results[name] = result
+            print(f"{name:<22}{result['throughput']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['peak_kb']:>12}")
+        print(f"fake server: {server.requests} requests, {server.throttled} throttled")
+    finally:
+        await roblox.close_session()
+        charts.shutdown()
+        await server.stop()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ISB benchmarks against a fake Roblox API.")
+    parser.add_argument("--only", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="keep caches between operations")
+    parser.add_argument("--group-size", type=int, default=5000)
+    parser.add_argument("--overlap", type=float, default=0.1)
+    parser.add_argument("--badges", type=int, default=300)
+    parser.add_argument("--friends", type=int, default=200)
+    parser.add_argument("--user-groups", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added latency per request")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--real-limits", action="store_true", help="keep the production token-bucket limits")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown ratio before flagging")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    # The roster store must not touch the real database
+    os.environ.setdefault("ISB_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="isb-bench-"), "bench.sqlite3"))
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# Seconds each kind of Roblox data stays fresh
+TTLS = {
+    "profile": 600,
+    "counts": 300,
+    "badges": 1800,
+    "groups": 900,
+    "friends": 900,
+    "roster": 900,
+}
+
+# Approximate in-memory bytes per cached item (per element for lists and
+# dicts), measured with sys.getsizeof over typical Roblox payloads
+ITEM_BYTES = {
+    "profile": 1200,  # (status, user record)
+    "counts": 100,
+    "badges": 320,  # {name, date} per badge
+    "groups": 330,  # {id, name, rank, rank_num} per group
+    "friends": 40,  # one id per friend
+    "roster": 300,  # username -> {rank_name, rank_num} per member
+}
+DEFAULT_ITEM_BYTES = 300
+MAX_BYTES = int(os.environ.get("ISB_CACHE_MAX_BYTES") or 64 * 1024 * 1024)
+
+def entry_weight(key, value):
+    # Estimated memory cost in bytes: exact for bytes values (rendered charts),
+    # otherwise the item count times the per-kind item size
+    if isinstance(value, (bytes, bytearray)):
+        return max(len(value), 1)
+    kind = key[0] if isinstance(key, tuple) and key else None
+    items = max(len(value), 1) if isinstance(value, (list, dict, set)) else 1
+    return items * ITEM_BYTES.get(kind, DEFAULT_ITEM_BYTES)
+
+class TTLCache:
+    # max_weight is an approximate memory budget in bytes, see entry_weight
+    def __init__(self, max_weight=MAX_BYTES):
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, weight, value)
+        self._inflight = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def set(self, key, value, ttl):
+        if key in self._entries:
+            self._remove(key)
+        weight = entry_weight(key, value)
+        if weight > self.max_weight:
+            return
+        self._entries[key] = (time.monotonic() + ttl, weight, value)
+        self.weight += weight
+        while self.weight > self.max_weight:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.weight = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.weight -= entry[1]
+
+    async def get_or_fetch(self, key, ttl, fetch, should_cache=None):
+        # Concurrent misses on the same key share one in-flight fetch
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, ttl, t, should_cache))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, ttl, task, should_cache):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if should_cache is None or should_cache(value):
+            self.set(key, value, ttl)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+import metrics
+from cache import TTLCache
+
+# Charts are rendered in a worker process with the object-oriented
+# Figure/Agg API; matplotlib is only imported inside the worker. The worker
+# is spawned rather than forked from the running bot, and replaced if it dies.
+MAX_POINTS = 400  # longer histories are downsampled before plotting
+CHART_TTL = 3600
+POOL_WORKERS = 1
+
+_pool = None
+chart_cache = TTLCache(max_weight=16 * 1024 * 1024)  # PNG bytes
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+def downsample(ordinals):
+    # Returns (x, y) for the cumulative curve, keeping the first and last points
+    cumulative = list(range(1, len(ordinals) + 1))
+    if len(ordinals) <= MAX_POINTS:
+        return ordinals, cumulative
+    step = len(ordinals) / (MAX_POINTS - 1)
+    indices = sorted({min(round(i * step), len(ordinals) - 1) for i in range(MAX_POINTS)})
+    return [ordinals[i] for i in indices], [cumulative[i] for i in indices]
+
+def render_badge_chart(username, ordinals, cumulative):
+    # Runs in the worker process
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    dates = [date.fromordinal(o) for o in ordinals]
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(dates, cumulative, marker='o', color='#C0C0C0', linewidth=2, markersize=5 if len(dates) < 100 else 2)
+    ax.fill_between(dates, cumulative, color='#E5E5E5', alpha=0.5)
+    ax.set_title(f"Badge Progression for {username}", fontsize=16, color='#808080')
+    ax.set_xlabel('Awarded Date', fontsize=12, color='#808080')
+    ax.set_ylabel('Cumulative Badge Count', fontsize=12, color='#808080')
+    ax.tick_params(axis='x', labelrotation=45, colors='#808080')
+    ax.tick_params(axis='y', colors='#808080')
+    ax.grid(True, color='#D3D3D3', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', facecolor='#F5F5F5')
+    return buf.getvalue()
+
+def render_overlap_heatmap(labels, matrix):
+    # Runs in the worker process; matrix[i][j] is the overlap of groups i and j
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    size = max(6, len(labels) * 0.9)
+    fig = Figure(figsize=(size + 1.5, size))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    # Scale colours to the off-diagonal overlaps; the diagonal is roster size
+    peak = max((value for i, row in enumerate(matrix) for j, value in enumerate(row) if i != j), default=0) or 1
+    image = ax.imshow(matrix, cmap='Greys', vmin=0, vmax=peak)
+    fig.colorbar(image, ax=ax)
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right', color='#808080')
+    ax.set_yticks(range(len(labels)), labels, color='#808080')
+    for i, row in enumerate(matrix):
+        for j, value in enumerate(row):
+            ax.text(j, i, str(value), ha='center', va='center', fontsize=9, color='white' if value > peak / 2 else '#404040')
+    ax.set_title("Group Member Overlap", fontsize=16, color='#808080')
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', facecolor='#F5F5F5')
+    return buf.getvalue()
+
+async def badge_chart(user_id, username, dates):
+    # PNG bytes of the cumulative badge curve; cached per user and badge fingerprint
+    ordinals = sorted(d.toordinal() for d in dates)
+    key = (user_id, username, len(ordinals), ordinals[0], ordinals[-1])
+    xs, ys = downsample(ordinals)
+    return await chart_cache.get_or_fetch(key, CHART_TTL, lambda: render_in_pool(render_badge_chart, username, xs, ys))
+
+async def overlap_heatmap(labels, matrix):
+    # PNG bytes of the pairwise overlap matrix; cached per labels and counts
+    key = ("overlap", tuple(labels), tuple(map(tuple, matrix)))
+    return await chart_cache.get_or_fetch(key, CHART_TTL, lambda: render_in_pool(render_overlap_heatmap, labels, matrix))
+
+async def render_in_pool(render, *args):
+    pool = get_pool()
+    with metrics.timed("isb_chart_render_seconds"):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, render, *args)
+        except BrokenProcessPool:
+            # A dead worker breaks the pool for good; the next render starts a new one
+            if _pool is pool:
+                shutdown()
+            raise
@@ -0,0 +1,58 @@
+import asyncio
+import atexit
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import ratelimit
+
+# Optional process pool for long Roblox crawls (roster refreshes, alt-cluster
+# expansion), so they do not compete with the gateway for the bot's core.
+# Each worker keeps one event loop, so its HTTP session and caches persist
+# between jobs. Workers are spawned rather than forked from the running bot.
+# CRAWL_WORKERS=0 (the default) runs everything in-process.
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS") or 0)
+
+_pool = None
+_loop = None  # worker side
+
+def enabled():
+    return CRAWL_WORKERS > 0
+
+def _init_worker():
+    global _loop
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    atexit.register(_close_worker)
+
+def _close_worker():
+    import roblox
+    _loop.run_until_complete(roblox.close_session())
+    _loop.close()
+
+def _run(module, name, args, priority):
+    # Runs in the worker; jobs keep the request priority of their caller
+    fn = getattr(importlib.import_module(module), name)
+    ratelimit.current_priority.set(priority)
+    return _loop.run_until_complete(fn(*args))
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=CRAWL_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+async def run(fn, *args):
+    # Awaits the module-level coroutine function fn(*args) in a worker;
+    # arguments and result must pickle
+    if not enabled():
+        return await fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(
+        get_pool(), _run, fn.__module__, fn.__name__, args, ratelimit.current_priority.get()
+    )
@@ -1,15 +1,82 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import requests
-from datetime import datetime, timezone
-import matplotlib.pyplot as plt
 import io
+import asyncio
+import hashlib
+import json
 import os
+import re
+import time
+import roblox
+import charts
+import roster_store
+import member_index
+import metrics
+import watchlist
+import alt_cluster
+import crawl_pool
+from roblox import get_user_profile, get_user_badges_full, get_user_groups, compare_users
+
+class ISBCommandTree(app_commands.CommandTree):
+    # Stamps every slash command so its latency can be recorded on completion
+    async def interaction_check(self, interaction: discord.Interaction):
+        interaction.extras["started_at"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        record_command_metrics(interaction, error=True)
+        await super().on_error(interaction, error)
+
+def record_command_metrics(interaction, error=False):
+    started_at = interaction.extras.get("started_at")
+    if started_at is not None and interaction.command is not None:
+        metrics.record_command(interaction.command.name, time.perf_counter() - started_at, error)
+
+def collect_cache_metrics():
+    for name, cache in (("roblox", roblox.cache), ("charts", charts.chart_cache)):
+        for stat, value in cache.stats().items():
+            metrics.set_gauge(f"isb_cache_{stat}", value, cache=name)
+
+async def post_watchlist_changes(channel_id, title, lines):
+    channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+    description = ""
+    for line in lines:
+        if len(description) + len(line) > 4000:
+            description += f"... and more ({len(lines)} changes total)"
+            break
+        description += line + "\n"
+    embed = discord.Embed(title=title, description=description, color=0xFFA500)
+    embed.set_footer(text="Information extracted from ISB database.")
+    await channel.send(embed=embed)
+
+# Sharding: SHARD_COUNT alone runs that many shards in this process; with
+# SHARD_IDS ("0,1") this process runs only those shards (see sharded.py).
+# Unset, discord.py picks the recommended shard count.
+SHARD_COUNT = int(os.environ["SHARD_COUNT"]) if os.environ.get("SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.environ["SHARD_IDS"].split(",")] if os.environ.get("SHARD_IDS") else None
+
+class ISBBot(commands.AutoShardedBot):
+    def is_primary(self):
+        # Only the process running shard 0 syncs commands and runs the schedulers
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    async def setup_hook(self):
+        if self.is_primary():
+            roster_store.start_refresher()
+            watchlist.start(post_watchlist_changes)
+        metrics.collectors.append(collect_cache_metrics)
+        await metrics.start()
+
+    async def close(self):
+        await roblox.close_session()
+        charts.shutdown()
+        crawl_pool.shutdown()
+        await super().close()
 
 intents = discord.Intents.default()
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = ISBBot(command_prefix="!", intents=intents, tree_cls=ISBCommandTree, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 
 # Toggle this: True for global sync (test), False for guild-only (production)
 USE_GLOBAL_SYNC = True  # Set to False after testing
@@ -17,245 +84,270 @@ USE_GLOBAL_SYNC = True  # Set to False after testing
 # Your Discord user ID for restricted commands
 AUTHORIZED_USER_ID = 1459581008025227518
 
-# --- Roblox API Functions ---
+# Digest of the last synced command tree per scope, so reconnects and
+# restarts with unchanged commands skip bot.tree.sync()
+COMMAND_HASH_PATH = os.environ.get("COMMAND_HASH_PATH", "command_tree.json")
 
-def get_group_members_with_ranks(group_id):
-    members = {}
-    url = f"https://groups.roblox.com/v1/groups/{group_id}/users"
-    params = {"sortOrder": "Asc", "limit": 100}
-    try:
-        while True:
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code != 200:
-                return f"Error fetching members for group {group_id}: {response.status_code}"
-            data = response.json()
-            for user_data in data.get("data", []):
-                username = user_data["user"]["username"]
-                role = user_data.get("role", {})
-                rank_name = role.get("name", "Unknown")
-                rank_num = role.get("rank", "Unknown")
-                members[username] = {"rank_name": rank_name, "rank_num": rank_num}
-            next_page_cursor = data.get("nextPageCursor")
-            if not next_page_cursor:
-                break
-            params["cursor"] = next_page_cursor
-    except Exception as e:
-        return f"Network or other error fetching group {group_id}: {e}"
-    return members
+def command_tree_hash(guild=None):
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
 
-def get_user_profile(user_id):
+def load_command_hashes():
     try:
-        user_url = f"https://users.roblox.com/v1/users/{user_id}"
-        user_response = requests.get(user_url, timeout=10)
-        if user_response.status_code != 200:
-            return f"Error fetching user info: {user_response.status_code}"
-        user_data = user_response.json()
-        username = user_data.get("name", "Unknown")
-        display_name = user_data.get("displayName", "Unknown")
-        description = user_data.get("description", "No description")
-        created = user_data.get("created", "Unknown")
-        join_date = datetime.fromisoformat(created[:-1]).replace(tzinfo=timezone.utc) if created != "Unknown" else None
-        account_age_days = (datetime.now(timezone.utc) - join_date).days if join_date else "Unknown"
-        friends_count = requests.get(f"https://friends.roblox.com/v1/users/{user_id}/friends/count", timeout=10).json().get("count", 0)
-        followers_count = requests.get(f"https://friends.roblox.com/v1/users/{user_id}/followers/count", timeout=10).json().get("count", 0)
-        following_count = requests.get(f"https://friends.roblox.com/v1/users/{user_id}/followings/count", timeout=10).json().get("count", 0)
-        badges = []
-        badges_url = f"https://badges.roblox.com/v1/users/{user_id}/badges"
-        params = {"limit": 100}
-        while True:
-            badges_response = requests.get(badges_url, params=params, timeout=10)
-            if badges_response.status_code != 200:
-                break
-            badges_data = badges_response.json()
-            badges.extend([badge["name"] for badge in badges_data.get("data", [])])
-            next_cursor = badges_data.get("nextPageCursor")
-            if not next_cursor:
-                break
-            params["cursor"] = next_cursor
-        total_badges = len(badges)
-        risk_score = 0
-        risk_factors = []
-        if account_age_days != "Unknown" and account_age_days < 365:
-            risk_score += 2
-            risk_factors.append("Recent account (<1 year)")
-        if friends_count < 10:
-            risk_score += 1
-            risk_factors.append("Low friends (<10)")
-        if followers_count < 50:
-            risk_score += 1
-            risk_factors.append("Low followers (<50)")
-        if total_badges < 5:
-            risk_score += 1
-            risk_factors.append("Few badges (<5)")
-        risk_level = "Low" if risk_score <= 1 else "Medium" if risk_score <= 3 else "High"
-        return {
-            "username": username,
-            "display_name": display_name,
-            "description": description,
-            "join_date": created,
-            "account_age_days": account_age_days,
-            "friends_count": friends_count,
-            "followers_count": followers_count,
-            "following_count": following_count,
-            "total_badges": total_badges,
-            "badges_list": badges[:20],
-            "risk_level": risk_level,
-            "risk_factors": risk_factors
-        }
-    except Exception as e:
-        print(f"Profile fetch error for user {user_id}: {e}")  # Log for debugging
-        return "Unable to retrieve profile data. Please check the User ID."
+        with open(COMMAND_HASH_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-def get_user_badges_full(user_id):
-    badges = []
-    url = f"https://badges.roblox.com/v1/users/{user_id}/badges"
-    params = {"limit": 100}
-    try:
-        while True:
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code != 200:
-                return f"Error fetching badges: {response.status_code}"
-            data = response.json()
-            for badge in data.get("data", []):
-                name = badge.get("name", "Unknown")
-                awarded_date = badge.get("awardedDate")
-                date = datetime.fromisoformat(awarded_date[:-1]).replace(tzinfo=timezone.utc) if awarded_date else None
-                badges.append({"name": name, "date": date})
-            next_cursor = data.get("nextPageCursor")
-            if not next_cursor:
-                break
-            params["cursor"] = next_cursor
-    except Exception as e:
-        print(f"Badges fetch error for user {user_id}: {e}")  # Log for debugging
-        return "Unable to retrieve badge data. Please check the User ID."
-    return badges
-
-def get_user_groups(user_id):
-    groups = []
-    url = f"https://groups.roblox.com/v1/users/{user_id}/groups"
-    params = {"limit": 100}
-    try:
-        while True:
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code != 200:
-                return f"Error fetching groups: {response.status_code}"
-            data = response.json()
-            for group in data.get("data", []):
-                groups.append({
-                    "name": group["group"]["name"],
-                    "rank": group["role"]["name"],
-                    "rank_num": group["role"]["rank"]
-                })
-            next_cursor = data.get("nextPageCursor")
-            if not next_cursor:
-                break
-            params["cursor"] = next_cursor
-    except Exception as e:
-        return f"Network error fetching groups: {e}"
-    return groups
+def save_command_hash(scope, digest):
+    hashes = load_command_hashes()
+    hashes[scope] = digest
+    tmp_path = COMMAND_HASH_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, COMMAND_HASH_PATH)
 
-def compare_users(user_id_1, user_id_2):
-    try:
-        friends_1_response = requests.get(f"https://friends.roblox.com/v1/users/{user_id_1}/friends", timeout=10).json().get("data", [])
-        friends_2_response = requests.get(f"https://friends.roblox.com/v1/users/{user_id_2}/friends", timeout=10).json().get("data", [])
-        friends_1 = {f.get("name") or f.get("username", "Unknown") for f in friends_1_response if f.get("name") or f.get("username")}
-        friends_2 = {f.get("name") or f.get("username", "Unknown") for f in friends_2_response if f.get("name") or f.get("username")}
-        common_friends = friends_1 & friends_2
-        following_1_response = requests.get(f"https://friends.roblox.com/v1/users/{user_id_1}/followings", timeout=10).json().get("data", [])
-        following_2_response = requests.get(f"https://friends.roblox.com/v1/users/{user_id_2}/followings", timeout=10).json().get("data", [])
-        following_1 = {f.get("name") or f.get("username", "Unknown") for f in following_1_response if f.get("name") or f.get("username")}
-        following_2 = {f.get("name") or f.get("username", "Unknown") for f in following_2_response if f.get("name") or f.get("username")}
-        common_followers = following_1 & following_2
-        groups_1 = get_user_groups(user_id_1)
-        groups_2 = get_user_groups(user_id_2)
-        if isinstance(groups_1, str) or isinstance(groups_2, str):
-            return "Unable to retrieve group data for comparison. Please check the User IDs."
-        group_names_1 = {g["name"] for g in groups_1}
-        group_names_2 = {g["name"] for g in groups_2}
-        common_groups = group_names_1 & group_names_2
-        commonality_score = len(common_friends) + len(common_followers) + len(common_groups)
-        threat_level = "Low" if commonality_score < 5 else "Medium" if commonality_score <= 15 else "High"
-        return {
-            "common_friends": list(common_friends),
-            "common_followers": list(common_followers),
-            "common_groups": list(common_groups),
-            "threat_level": threat_level
-        }
-    except Exception as e:
-        print(f"Comparison error for users {user_id_1} and {user_id_2}: {e}")  # Log for debugging
-        return "Unable to perform comparison. Please check the User IDs."
+async def sync_commands(force=False):
+    # Returns the synced commands, or None if the tree matches the last sync
+    guild = None if USE_GLOBAL_SYNC else discord.Object(id=YOUR_GUILD_ID_HERE)
+    scope = "global" if guild is None else str(guild.id)
+    digest = command_tree_hash(guild)
+    if not force and load_command_hashes().get(scope) == digest:
+        return None
+    synced = await bot.tree.sync(guild=guild)
+    save_command_hash(scope, digest)
+    return synced
 
 # --- Discord Commands ---
 
+def format_names(names, limit=25):
+    # Keeps embed fields under Discord's 1024-character limit
+    text = ', '.join(names[:limit]) or 'None'
+    if len(names) > limit:
+        text += f" (+{len(names) - limit} more)"
+    return text[:1024]
+
+def format_risk_factors(profile):
+    # Each factor that fired, with the weight it added to the risk score
+    contributions = profile.get('contributions', {})
+    return ', '.join(f"{factor} (+{contributions[factor]:g})" for factor in profile['risk_factors']) or 'None'
+
+class JumpToPageModal(discord.ui.Modal, title="Jump to Page"):
+    page = discord.ui.TextInput(label="Page number", max_length=6)
+
+    def __init__(self, group_view):
+        super().__init__()
+        self.group_view = group_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        if self.page.value.strip().isdigit():
+            self.group_view.current_page = min(max(int(self.page.value) - 1, 0), self.group_view.page_count() - 1)
+        self.group_view.update_buttons()
+        await interaction.response.edit_message(embed=self.group_view.render(), view=self.group_view)
+
+class RankFilterModal(discord.ui.Modal, title="Filter by Rank"):
+    rank = discord.ui.TextInput(label="Rank name or number (blank to clear)", required=False, max_length=100)
+
+    def __init__(self, group_view):
+        super().__init__()
+        self.group_view = group_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.group_view.apply_filter(self.rank.value)
+        await interaction.response.edit_message(embed=self.group_view.render(), view=self.group_view)
+
 class GroupCheckView(discord.ui.View):
-    def __init__(self, pages, current_page=0):
+    # Holds only the compact match tuples; embeds are built when a page is shown
+    def __init__(self, matches, group_id_1, group_id_2, refreshed_at, per_page=5):
         super().__init__(timeout=300)
-        self.pages = pages
-        self.current_page = current_page
+        self.matches = matches
+        self.filtered = matches
+        self.rank_filter = ""
+        self.group_id_1 = group_id_1
+        self.group_id_2 = group_id_2
+        self.refreshed_at = refreshed_at
+        self.per_page = per_page
+        self.current_page = 0
+        self.message = None
         self.update_buttons()
 
+    def page_count(self):
+        return max(1, (len(self.filtered) + self.per_page - 1) // self.per_page)
+
     def update_buttons(self):
-        self.children[0].disabled = self.current_page == 0  # Previous
-        self.children[1].disabled = self.current_page == len(self.pages) - 1  # Next
+        self.previous_page.disabled = self.current_page == 0
+        self.next_page.disabled = self.current_page >= self.page_count() - 1
+
+    def apply_filter(self, rank):
+        rank = rank.strip().casefold()
+        self.rank_filter = rank
+        if rank:
+            self.filtered = [m for m in self.matches if rank in (str(m[1]).casefold(), str(m[2]), str(m[3]).casefold(), str(m[4]))]
+        else:
+            self.filtered = self.matches
+        self.current_page = 0
+        self.update_buttons()
+
+    def render(self):
+        start = self.current_page * self.per_page
+        description = ""
+        for username, rank_name_1, rank_num_1, rank_name_2, rank_num_2 in self.filtered[start:start + self.per_page]:
+            description += f"**{username}**\n- Rank in {self.group_id_1}: {rank_name_1} ({rank_num_1})\n- Rank in {self.group_id_2}: {rank_name_2} ({rank_num_2})\n\n"
+        embed = discord.Embed(title=f"Common Users in Groups {self.group_id_1} and {self.group_id_2}", description=description or "No users match this filter.", color=0x808080)
+        embed.add_field(name="Total Common Users", value=str(len(self.matches)), inline=True)
+        if self.rank_filter:
+            embed.add_field(name=f"Rank \"{self.rank_filter}\"", value=str(len(self.filtered)), inline=True)
+        embed.add_field(name="Data Refreshed", value=f"<t:{self.refreshed_at}:R>", inline=True)
+        embed.set_footer(text=f"Page {self.current_page + 1}/{self.page_count()} | Information extracted from ISB database.")
+        return embed
+
+    async def on_timeout(self):
+        # Free the match data and leave the last page without controls
+        self.matches = self.filtered = []
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
 
     @discord.ui.button(label="Previous", style=discord.ButtonStyle.grey)
     async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_page > 0:
             self.current_page -= 1
             self.update_buttons()
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
+            await interaction.response.edit_message(embed=self.render(), view=self)
 
     @discord.ui.button(label="Next", style=discord.ButtonStyle.grey)
     async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.current_page < len(self.pages) - 1:
+        if self.current_page < self.page_count() - 1:
             self.current_page += 1
             self.update_buttons()
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
+            await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Jump", style=discord.ButtonStyle.grey)
+    async def jump_to_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpToPageModal(self))
+
+    @discord.ui.button(label="Filter Rank", style=discord.ButtonStyle.grey)
+    async def filter_rank(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(RankFilterModal(self))
 
 @bot.tree.command(name="group_check", description="Check users in both Roblox groups and show their ranks.")
-@app_commands.describe(group_id_1="Group - 1", group_id_2="Group - 2")
-async def group_check(interaction: discord.Interaction, group_id_1: int, group_id_2: int):
+@app_commands.describe(group_id_1="Group - 1", group_id_2="Group - 2", live="Fetch fresh rosters now instead of using stored data")
+async def group_check(interaction: discord.Interaction, group_id_1: int, group_id_2: int, live: bool = False):
     await interaction.response.defer()
-    members_1 = get_group_members_with_ranks(group_id_1)
-    if isinstance(members_1, str):
+    if live:
+        # Streaming intersection: only the smaller roster and the matches are held in memory
+        intersection_list = await roblox.intersect_group_members(group_id_1, group_id_2)
+        refreshed_1 = refreshed_2 = time.time()
+    else:
+        # Rosters come from the persistent store; untracked groups are crawled once
+        refreshed_1, refreshed_2 = await asyncio.gather(roster_store.ensure_roster(group_id_1), roster_store.ensure_roster(group_id_2))
+        intersection_list = None
+    if isinstance(refreshed_1, str) or isinstance(refreshed_2, str) or isinstance(intersection_list, str):
         embed = discord.Embed(title="Error", description="Unable to retrieve group data. Please check the Group IDs.", color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
         return
-    members_2 = get_group_members_with_ranks(group_id_2)
-    if isinstance(members_2, str):
-        embed = discord.Embed(title="Error", description="Unable to retrieve group data. Please check the Group IDs.", color=0xFF0000)
+    if intersection_list is None:
+        intersection_list = await roster_store.intersect(group_id_1, group_id_2)
+    if not intersection_list:
+        embed = discord.Embed(title="No Common Users", description="No users are in both groups.", color=0x808080)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
         return
-    intersection = set(members_1.keys()) & set(members_2.keys())
-    if not intersection:
-        embed = discord.Embed(title="No Common Users", description="No users are in both groups.", color=0x808080)
+    view = GroupCheckView(intersection_list, group_id_1, group_id_2, int(min(refreshed_1, refreshed_2)))
+    view.message = await interaction.followup.send(embed=view.render(), view=view, wait=True)
+
+MAX_MATRIX_GROUPS = 10
+
+class GroupMatrixView(discord.ui.View):
+    # Pages through the members found in at least min_groups of the groups
+    def __init__(self, members, group_ids, min_groups, refreshed_at, per_page=10):
+        super().__init__(timeout=300)
+        self.members = members
+        self.group_ids = group_ids
+        self.min_groups = min_groups
+        self.refreshed_at = refreshed_at
+        self.per_page = per_page
+        self.current_page = 0
+        self.message = None
+        self.update_buttons()
+
+    def page_count(self):
+        return max(1, (len(self.members) + self.per_page - 1) // self.per_page)
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.current_page == 0
+        self.next_page.disabled = self.current_page >= self.page_count() - 1
+
+    def render(self):
+        start = self.current_page * self.per_page
+        description = ""
+        for username, memberships in self.members[start:start + self.per_page]:
+            ranks = ', '.join(f"{group_id}: {rank_name} ({rank_num})" for group_id, rank_name, rank_num in memberships)
+            description += f"**{username}** - {len(memberships)} groups\n- {ranks}\n"
+        embed = discord.Embed(title=f"Members in {self.min_groups}+ of {len(self.group_ids)} Groups", description=description[:4096] or "No users are in that many of these groups.", color=0x808080)
+        embed.add_field(name="Groups", value=', '.join(str(group_id) for group_id in self.group_ids), inline=False)
+        embed.add_field(name="Total Shared Users", value=str(len(self.members)), inline=True)
+        embed.add_field(name="Data Refreshed", value=f"<t:{self.refreshed_at}:R>", inline=True)
+        embed.set_footer(text=f"Page {self.current_page + 1}/{self.page_count()} | Information extracted from ISB database.")
+        return embed
+
+    async def on_timeout(self):
+        self.members = []
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page > 0:
+            self.current_page -= 1
+            self.update_buttons()
+            await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page < self.page_count() - 1:
+            self.current_page += 1
+            self.update_buttons()
+            await interaction.response.edit_message(embed=self.render(), view=self)
+
+@bot.tree.command(name="group_matrix", description="Compare member overlap across several Roblox groups at once.")
+@app_commands.describe(group_ids=f"Up to {MAX_MATRIX_GROUPS} Group IDs separated by spaces or commas", min_groups="List users found in at least this many of the groups")
+async def group_matrix(interaction: discord.Interaction, group_ids: str, min_groups: app_commands.Range[int, 2, MAX_MATRIX_GROUPS] = 2):
+    await interaction.response.defer()
+    ids = list(dict.fromkeys(int(match) for match in re.findall(r"\d+", group_ids)))[:MAX_MATRIX_GROUPS]
+    if len(ids) < 2:
+        embed = discord.Embed(title="Error", description="Provide at least two Group IDs.", color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
         return
-    intersection_list = list(intersection)
-    pages = []
-    per_page = 5
-    for i in range(0, len(intersection_list), per_page):
-        page_users = intersection_list[i:i + per_page]
-        description = ""
-        for username in page_users:
-            rank_1 = members_1[username]
-            rank_2 = members_2[username]
-            description += f"**{username}**\n- Rank in {group_id_1}: {rank_1['rank_name']} ({rank_1['rank_num']})\n- Rank in {group_id_2}: {rank_2['rank_name']} ({rank_2['rank_num']})\n\n"
-        embed = discord.Embed(title=f"Common Users in Groups {group_id_1} and {group_id_2}", description=description, color=0x808080)
-        embed.add_field(name="Total Common Users", value=str(len(intersection_list)), inline=True)
+    # Each roster is crawled at most once, all of them concurrently
+    refreshed = await asyncio.gather(*(roster_store.ensure_roster(group_id) for group_id in ids))
+    if any(isinstance(refreshed_at, str) for refreshed_at in refreshed):
+        embed = discord.Embed(title="Error", description="Unable to retrieve group data. Please check the Group IDs.", color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
-        pages.append(embed)
-    view = GroupCheckView(pages)
-    await interaction.followup.send(embed=pages[0], view=view)
+        await interaction.followup.send(embed=embed)
+        return
+    matrix, members = await roster_store.overlap(ids, min(min_groups, len(ids)))
+    try:
+        files = [discord.File(io.BytesIO(await charts.overlap_heatmap([str(group_id) for group_id in ids], matrix)), 'group_matrix.png')]
+    except Exception as e:
+        print(f"Group matrix chart error for groups {ids}: {e!r}")  # Log for debugging
+        files = []  # The member list is still worth sending without the heatmap
+    view = GroupMatrixView(members, ids, min(min_groups, len(ids)), int(min(refreshed)))
+    view.message = await interaction.followup.send(embed=view.render(), files=files, view=view, wait=True)
 
 @bot.tree.command(name="profile_analysis", description="Advanced Roblox profile check for ALT risk analysis.")
 @app_commands.describe(user_id="Roblox User ID")
 async def profile_analysis(interaction: discord.Interaction, user_id: int):
     await interaction.response.defer()
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
     if isinstance(profile, str):
         embed = discord.Embed(title="Error", description=profile, color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
@@ -273,16 +365,111 @@ async def profile_analysis(interaction: discord.Interaction, user_id: int):
     embed.add_field(name="Following", value=str(profile['following_count']), inline=True)
     embed.add_field(name="Total Badges", value=str(profile['total_badges']), inline=True)
     embed.add_field(name="Badges", value=', '.join(profile['badges_list']) or 'None', inline=False)
-    embed.add_field(name="Threat Level", value=threat_level, inline=True)
-    embed.add_field(name="Risk Factors", value=', '.join(profile['risk_factors']) if profile['risk_factors'] else 'None', inline=False)
+    embed.add_field(name="Threat Level", value=f"{threat_level} (score {profile['risk_score']:g})", inline=True)
+    embed.add_field(name="Risk Factors", value=format_risk_factors(profile), inline=False)
     embed.set_footer(text="Information extracted from ISB database.")
     await interaction.followup.send(embed=embed)
 
+RISK_ORDER = {"High": 0, "Medium": 1, "Low": 2}
+MAX_SCAN_IDS = 200
+MAX_SCAN_FILE_BYTES = 64 * 1024  # far more than MAX_SCAN_IDS ids need
+
+class ProfileScanView(discord.ui.View):
+    # Pages are rendered on demand from the results gathered so far
+    def __init__(self, results, total, per_page=10):
+        super().__init__(timeout=300)
+        self.results = results
+        self.total = total
+        self.per_page = per_page
+        self.current_page = 0
+        self.update_buttons()
+
+    def page_count(self):
+        return max(1, (len(self.results) + self.per_page - 1) // self.per_page)
+
+    def update_buttons(self):
+        self.children[0].disabled = self.current_page == 0  # Previous
+        self.children[1].disabled = self.current_page >= self.page_count() - 1  # Next
+
+    def render(self):
+        ordered = sorted(self.results, key=lambda r: (RISK_ORDER.get(r.get("risk_level"), 3), str(r["username"]).lower()))
+        page_results = ordered[self.current_page * self.per_page:(self.current_page + 1) * self.per_page]
+        lines = []
+        for result in page_results:
+            if "error" in result:
+                lines.append(f"**{result['username']}** ({result['user_id']}) - {result['error']}")
+            else:
+                factors = format_risk_factors(result)
+                lines.append(f"**{result['username']}** ({result['user_id']}) - {result['risk_level']}: {factors}")
+        high_count = sum(1 for r in self.results if r.get("risk_level") == "High")
+        color = 0xFF0000 if high_count else 0x808080
+        embed = discord.Embed(title="Profile Scan", description='\n'.join(lines) or "Scanning...", color=color)
+        embed.add_field(name="Progress", value=f"{len(self.results)}/{self.total}", inline=True)
+        embed.add_field(name="High Risk", value=str(high_count), inline=True)
+        embed.add_field(name="Page", value=f"{self.current_page + 1}/{self.page_count()}", inline=True)
+        embed.set_footer(text="Information extracted from ISB database.")
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page > 0:
+            self.current_page -= 1
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page < self.page_count() - 1:
+            self.current_page += 1
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+@bot.tree.command(name="profile_scan", description="Batch ALT risk scan for many Roblox user IDs.")
+@app_commands.describe(user_ids="Roblox User IDs separated by spaces or commas", attachment="Optional text file of Roblox User IDs")
+async def profile_scan(interaction: discord.Interaction, user_ids: str = None, attachment: discord.Attachment = None):
+    await interaction.response.defer()
+    text = user_ids or ""
+    if attachment:
+        # Checked before downloading, so a large upload is never read into memory
+        if attachment.size > MAX_SCAN_FILE_BYTES:
+            embed = discord.Embed(title="Error", description=f"Attachment is too large; the limit is {MAX_SCAN_FILE_BYTES // 1024} KB.", color=0xFF0000)
+            embed.set_footer(text="Information extracted from ISB database.")
+            await interaction.followup.send(embed=embed)
+            return
+        text += " " + (await attachment.read()).decode("utf-8", errors="ignore")
+    ids = list(dict.fromkeys(int(match) for match in re.findall(r"\d+", text)))
+    if not ids:
+        embed = discord.Embed(title="Error", description="No Roblox User IDs provided.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.followup.send(embed=embed)
+        return
+    ids = ids[:MAX_SCAN_IDS]
+    results = []
+    view = ProfileScanView(results, len(ids))
+    message = await interaction.followup.send(embed=view.render(), view=view, wait=True)
+    last_edit = time.monotonic()
+    try:
+        async for result in roblox.scan_profiles(ids):
+            results.append(result)
+            # Stream progress back without hitting message edit rate limits
+            if time.monotonic() - last_edit >= 1.5:
+                view.update_buttons()
+                await message.edit(embed=view.render(), view=view)
+                last_edit = time.monotonic()
+    except Exception as e:
+        print(f"profile_scan error: {e}")  # Log for debugging
+        embed = discord.Embed(title="Error", description="Unable to resolve the User IDs. Please check the input.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await message.edit(embed=embed, view=None)
+        return
+    view.update_buttons()
+    await message.edit(embed=view.render(), view=view)
+
 @bot.tree.command(name="compare_users", description="Compare common friends, followers, and groups between two Roblox users.")
-@app_commands.describe(user_id_1="First Roblox User ID", user_id_2="Second Roblox User ID")
-async def compare_users_command(interaction: discord.Interaction, user_id_1: int, user_id_2: int):
+@app_commands.describe(user_id_1="First Roblox User ID", user_id_2="Second Roblox User ID", threat_only="Only report the threat level, stopping as soon as it reaches High")
+async def compare_users_command(interaction: discord.Interaction, user_id_1: int, user_id_2: int, threat_only: bool = False):
     await interaction.response.defer()
-    comparison = compare_users(user_id_1, user_id_2)
+    comparison = await compare_users(user_id_1, user_id_2, threat_only=threat_only)
     if isinstance(comparison, str):
         embed = discord.Embed(title="Error", description=comparison, color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
@@ -291,24 +478,58 @@ async def compare_users_command(interaction: discord.Interaction, user_id_1: int
     threat_level = comparison["threat_level"]
     color = 0x00FF00 if threat_level == "Low" else 0xFFA500 if threat_level == "Medium" else 0xFF0000
     embed = discord.Embed(title=f"User Comparison: {user_id_1} vs {user_id_2}", color=color)
-    embed.add_field(name="Common Friends", value=', '.join(comparison['common_friends']) or 'None', inline=False)
-    embed.add_field(name="Common Followers", value=', '.join(comparison['common_followers']) or 'None', inline=False)
-    embed.add_field(name="Common Groups", value=', '.join(comparison['common_groups']) or 'None', inline=False)
+    if threat_only:
+        # A High result may have stopped the crawl early, so the score is a lower bound
+        score = comparison["commonality_score"]
+        embed.add_field(name="Commonality Score", value=f"{score}+" if threat_level == "High" else str(score), inline=True)
+    else:
+        embed.add_field(name="Common Friends", value=format_names(comparison['common_friends']), inline=False)
+        embed.add_field(name="Common Followers", value=format_names(comparison['common_followers']), inline=False)
+        embed.add_field(name="Common Groups", value=format_names(comparison['common_groups']), inline=False)
     embed.add_field(name="Threat Level", value=threat_level, inline=True)
     embed.set_footer(text="Information extracted from ISB database.")
     await interaction.followup.send(embed=embed)
 
+ALT_CLUSTER_RESULTS = 10
+
+@bot.tree.command(name="alt_cluster", description="Find likely alt accounts around a Roblox user via their friend graph.")
+@app_commands.describe(user_id="Seed Roblox User ID", depth="1: friends of the user only, 2: also friends of friends")
+async def alt_cluster_command(interaction: discord.Interaction, user_id: int, depth: app_commands.Range[int, 1, alt_cluster.MAX_DEPTH] = alt_cluster.DEFAULT_DEPTH):
+    await interaction.response.defer()
+    cluster = await crawl_pool.run(alt_cluster.find_cluster, user_id, depth)
+    if isinstance(cluster, str):
+        embed = discord.Embed(title="Error", description=cluster, color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.followup.send(embed=embed)
+        return
+    lines = []
+    for candidate in cluster["candidates"][:ALT_CLUSTER_RESULTS]:
+        if "error" in candidate:
+            continue
+        lines.append(
+            f"**{candidate['username']}** ({candidate['user_id']}) - score {candidate['cluster_score']:g}\n"
+            f"- {candidate['shared_friends']} shared friends, {candidate['shared_groups']} shared groups, {candidate['depth']} hop(s) away\n"
+            f"- {candidate['risk_level']} risk: {format_risk_factors(candidate)}"
+        )
+    top_level = min((c["risk_level"] for c in cluster["candidates"][:ALT_CLUSTER_RESULTS] if "error" not in c), key=RISK_ORDER.get, default="Low")
+    color = 0x00FF00 if top_level == "Low" else 0xFFA500 if top_level == "Medium" else 0xFF0000
+    embed = discord.Embed(title=f"Alt Cluster for {user_id}", description='\n'.join(lines)[:4096] or "No connected accounts found.", color=color)
+    embed.add_field(name="Accounts Explored", value=str(cluster["nodes"]), inline=True)
+    embed.add_field(name="Links", value=str(cluster["edges"]), inline=True)
+    embed.add_field(name="Groups Compared", value=str(cluster["groups"]), inline=True)
+    embed.set_footer(text="Information extracted from ISB database.")
+    await interaction.followup.send(embed=embed)
+
 @bot.tree.command(name="profile_intel", description="Detailed Roblox profile inspector with groups, badges, and account details.")
 @app_commands.describe(user_id="Roblox User ID")
 async def profile_intel(interaction: discord.Interaction, user_id: int):
     await interaction.response.defer()
-    profile = get_user_profile(user_id)
+    profile, groups = await asyncio.gather(get_user_profile(user_id), get_user_groups(user_id))
     if isinstance(profile, str):
         embed = discord.Embed(title="Error", description=profile, color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
         return
-    groups = get_user_groups(user_id)
     if isinstance(groups, str):
         embed = discord.Embed(title="Error", description="Unable to retrieve group data. Please check the User ID.", color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
@@ -328,30 +549,31 @@ async def profile_intel(interaction: discord.Interaction, user_id: int):
     groups_str = '\n'.join([f"- {g['name']} | {g['rank']} ({g['rank_num']})" for g in groups[:10]]) or 'None'
     embed.add_field(name="Groups", value=groups_str, inline=False)
     embed.add_field(name="Past Usernames", value="Not available via API", inline=False)
-    embed.add_field(name="Threat Level", value=threat_level, inline=True)
-    embed.add_field(name="Risk Factors", value=', '.join(profile['risk_factors']) if profile['risk_factors'] else 'None', inline=False)
+    embed.add_field(name="Threat Level", value=f"{threat_level} (score {profile['risk_score']:g})", inline=True)
+    embed.add_field(name="Risk Factors", value=format_risk_factors(profile), inline=False)
     embed.set_footer(text="Information extracted from ISB database.")
     await interaction.followup.send(embed=embed)
 
 @bot.tree.command(name="badge_info", description="Generate a badge graph for a Roblox user.")
 @app_commands.describe(user_id="Roblox User ID")
 async def badge_info(interaction: discord.Interaction, user_id: int):
-    profile = get_user_profile(user_id)
+    await interaction.response.defer()
+    profile = await get_user_profile(user_id)
     if isinstance(profile, str):
         embed = discord.Embed(title="Error", description=profile, color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         return
-    badges = get_user_badges_full(user_id)
+    badges = await get_user_badges_full(user_id)
     if isinstance(badges, str):
         embed = discord.Embed(title="Error", description=badges, color=0xFF0000)
         embed.set_footer(text="Information extracted from ISB database.")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         return
     if not badges:
         embed = discord.Embed(title=f"Badge Info for {profile['username']}", description="No badges found.", color=0xC0C0C0)
         embed.set_footer(text="Information extracted from ISB database.")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         return
     # Prepare data
     total_badges = len(badges)
@@ -363,42 +585,93 @@ async def badge_info(interaction: discord.Interaction, user_id: int):
     if badges_without_dates:
         description += "\n**Badges without Dates:**\n" + "\n".join([f"- {b['name']}" for b in badges_without_dates[:20]])
     embed = discord.Embed(title=f"Badge Info for {profile['username']}", description=description, color=0xC0C0C0)
+    embed.set_footer(text="Information extracted from ISB database.")
+    png = None
     if badges_with_dates:
-        # Generate graph for badges with dates
-        dates = sorted([b["date"].date() for b in badges_with_dates])
-        cumulative = list(range(1, len(dates) + 1))
-        plt.figure(figsize=(10, 6))
-        plt.plot(dates, cumulative, marker='o', color='#C0C0C0', linewidth=2, markersize=5)
-        plt.fill_between(dates, cumulative, color='#E5E5E5', alpha=0.5)
-        plt.title(f"Badge Progression for {profile['username']}", fontsize=16, color='#808080')
-        plt.xlabel('Awarded Date', fontsize=12, color='#808080')
-        plt.ylabel('Cumulative Badge Count', fontsize=12, color='#808080')
-        plt.xticks(rotation=45, color='#808080')
-        plt.yticks(color='#808080')
-        plt.grid(True, color='#D3D3D3', linestyle='--', alpha=0.7)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor='#F5F5F5')
-        buf.seek(0)
-        plt.close()
-        file = discord.File(buf, 'badge_graph.png')
+        # Graph is rendered off the event loop in the chart worker; the badge list is sent without it if rendering fails
+        try:
+            png = await charts.badge_chart(user_id, profile['username'], [b["date"].date() for b in badges_with_dates])
+        except Exception as e:
+            print(f"Badge chart error for user {user_id}: {e!r}")  # Log for debugging
+    if png is not None:
         embed.set_image(url="attachment://badge_graph.png")
-        embed.set_footer(text="Information extracted from ISB database.")
-        await interaction.response.send_message(embed=embed, file=file)
+        await interaction.followup.send(embed=embed, file=discord.File(io.BytesIO(png), 'badge_graph.png'))
     else:
+        await interaction.followup.send(embed=embed)
+
+@bot.tree.command(name="watchlist", description="Manage the Roblox user and group watchlist (changes are admin only).")
+@app_commands.describe(action="What to do", target_id="Roblox User ID or Group ID")
+@app_commands.choices(action=[
+    app_commands.Choice(name="Add user", value="add_user"),
+    app_commands.Choice(name="Add group", value="add_group"),
+    app_commands.Choice(name="Remove user", value="remove_user"),
+    app_commands.Choice(name="Remove group", value="remove_group"),
+    app_commands.Choice(name="List", value="list"),
+])
+async def watchlist_command(interaction: discord.Interaction, action: app_commands.Choice[str], target_id: int = None):
+    await watchlist.reload_state()
+    if action.value == "list":
+        users = ', '.join(watchlist.state["users"]) or 'None'
+        groups = ', '.join(watchlist.state["groups"]) or 'None'
+        channel = f"<#{watchlist.state['channel_id']}>" if watchlist.state["channel_id"] else "Not configured"
+        embed = discord.Embed(title="Watchlist", color=0x808080)
+        embed.add_field(name="Users", value=users[:1024], inline=False)
+        embed.add_field(name="Groups", value=groups[:1024], inline=False)
+        embed.add_field(name="Report Channel", value=channel, inline=False)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.response.send_message(embed=embed)
+        return
+    # Every watched entry spends the shared Roblox budget (a group costs a full roster crawl), so only the admin edits the list
+    if interaction.user.id != AUTHORIZED_USER_ID:
+        embed = discord.Embed(title="Unauthorized", description="Access denied.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    if target_id is None:
+        embed = discord.Embed(title="Error", description="Please provide a Roblox User ID or Group ID.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.response.send_message(embed=embed)
+        return
+    handlers = {
+        "add_user": (watchlist.add_user, "Now watching user", "User is already watched"),
+        "add_group": (watchlist.add_group, "Now watching group", "Group is already watched"),
+        "remove_user": (watchlist.remove_user, "Stopped watching user", "User is not watched"),
+        "remove_group": (watchlist.remove_group, "Stopped watching group", "Group is not watched"),
+    }
+    handler, done_text, noop_text = handlers[action.value]
+    changed = handler(target_id)
+    if changed:
+        await watchlist.save_state()
+    embed = discord.Embed(title="Watchlist Updated" if changed else "Watchlist Unchanged", description=f"{done_text if changed else noop_text}: {target_id}", color=0x00FF00 if changed else 0x808080)
+    embed.set_footer(text="Information extracted from ISB database.")
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="watchlist_channel", description="Post watchlist changes to this channel (admin only).")
+async def watchlist_channel(interaction: discord.Interaction):
+    if interaction.user.id != AUTHORIZED_USER_ID:
+        embed = discord.Embed(title="Unauthorized", description="Access denied.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    await watchlist.reload_state()
+    watchlist.set_channel(interaction.channel_id)
+    await watchlist.save_state()
+    embed = discord.Embed(title="Watchlist Channel Set", description=f"Watchlist changes will be posted in <#{interaction.channel_id}>.", color=0x00FF00)
+    embed.set_footer(text="Information extracted from ISB database.")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="tge_user_lookup", description="Lookup Discord user info by username or ID in this server.")
 @app_commands.describe(user_input="Discord Username or User ID")
 async def tge_user_lookup(interaction: discord.Interaction, user_input: str):
     await interaction.response.defer()
     try:
-        # Try to get user by ID first
-        user = bot.get_user(int(user_input)) if user_input.isdigit() else None
+        # Try to get member by ID first
+        user = interaction.guild.get_member(int(user_input)) if user_input.isdigit() else None
+        other_matches = []
         if not user:
-            # Search by username (case-insensitive, partial match)
-            user = discord.utils.find(lambda u: user_input.lower() in u.name.lower() or (u.display_name and user_input.lower() in u.display_name.lower()), interaction.guild.members)
+            # Search by username or display name (case-insensitive, partial match)
+            matches = member_index.index.search(bot, user_input, guild_id=interaction.guild.id)
+            user, other_matches = (matches[0], matches[1:]) if matches else (None, [])
         if not user:
             embed = discord.Embed(title="User Not Found", description="User not found in this server. Ensure the username/ID is correct and the user is a member.", color=0xFF0000)
             embed.set_footer(text="Information extracted from ISB database.")
@@ -408,6 +681,8 @@ async def tge_user_lookup(interaction: discord.Interaction, user_input: str):
         embed.add_field(name="Account Created", value=user.created_at.strftime("%Y-%m-%d %H:%M:%S UTC"), inline=False)
         embed.add_field(name="Server Joined", value=user.joined_at.strftime("%Y-%m-%d %H:%M:%S UTC") if user.joined_at else "Not available", inline=False)
         embed.add_field(name="Roles", value=", ".join([role.name for role in user.roles if role.name != "@everyone"]) or "None", inline=False)
+        if other_matches:
+            embed.add_field(name="Other Matches", value=", ".join(f"{m} ({m.id})" for m in other_matches), inline=False)
         embed.set_footer(text=f"User ID: {user.id} | Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
     except Exception as e:
@@ -423,12 +698,11 @@ async def discord_user_lookup(interaction: discord.Interaction, user_input: str,
     try:
         # Try to get user by ID first
         user = bot.get_user(int(user_input)) if user_input.isdigit() else None
+        other_matches = []
         if not user:
             # Search by username globally (limited to bot's guilds)
-            for guild in bot.guilds:
-                user = discord.utils.find(lambda u: user_input.lower() in u.name.lower() or (u.display_name and user_input.lower() in u.display_name.lower()), guild.members)
-                if user:
-                    break
+            matches = member_index.index.search(bot, user_input)
+            user, other_matches = (matches[0], matches[1:]) if matches else (None, [])
         if not user:
             embed = discord.Embed(title="User Not Found", description="User not found. Ensure the username/ID is correct and accessible.", color=0xFF0000)
             embed.set_footer(text="Information extracted from ISB database.")
@@ -449,6 +723,8 @@ async def discord_user_lookup(interaction: discord.Interaction, user_input: str,
                     embed.add_field(name="Server Join Date", value="Invalid server ID", inline=False)
             except ValueError:
                 embed.add_field(name="Server Join Date", value="Invalid server ID format", inline=False)
+        if other_matches:
+            embed.add_field(name="Other Matches", value=", ".join(f"{m} ({m.id})" for m in other_matches), inline=False)
         embed.set_footer(text=f"User ID: {user.id} | Information extracted from ISB database.")
         await interaction.followup.send(embed=embed)
     except Exception as e:
@@ -466,12 +742,10 @@ async def calibrate_uplink(interaction: discord.Interaction):
         return
     await interaction.response.defer(ephemeral=True)
     try:
+        synced = await sync_commands(force=True)
         if USE_GLOBAL_SYNC:
-            synced = await bot.tree.sync()
             embed = discord.Embed(title="Uplink Calibrated", description=f"Successfully synced {len(synced)} command(s) globally.", color=0x00FF00)
         else:
-            guild = discord.Object(id=YOUR_GUILD_ID_HERE)
-            synced = await bot.tree.sync(guild=guild)
             embed = discord.Embed(title="Uplink Calibrated", description=f"Successfully synced {len(synced)} command(s) to the guild.", color=0x00FF00)
         embed.set_footer(text="Information extracted from ISB database.")
         await interaction.followup.send(embed=embed, ephemeral=True)
@@ -482,24 +756,97 @@ async def calibrate_uplink(interaction: discord.Interaction):
         await interaction.followup.send(embed=embed, ephemeral=True)
         print(f"Manual sync error: {e}")
 
+@bot.tree.command(name="uplink_stats", description="Show uplink latency and upstream statistics (admin only).")
+async def uplink_stats(interaction: discord.Interaction):
+    if interaction.user.id != AUTHORIZED_USER_ID:
+        embed = discord.Embed(title="Unauthorized", description="Access denied.", color=0xFF0000)
+        embed.set_footer(text="Information extracted from ISB database.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    metrics.run_collectors()
+    embed = discord.Embed(title="Uplink Stats", color=0x808080)
+    command_lines = []
+    for labels, histogram in sorted(metrics.histograms_named("isb_command_seconds").items(), key=lambda item: -item[1].count):
+        command = dict(labels)["command"]
+        errors = metrics.counters.get(("isb_commands_total", metrics.label_key({"command": command, "status": "error"})), 0)
+        command_lines.append(f"/{command}: {histogram.count} runs, p50 {histogram.quantile(0.5)}s, p95 {histogram.quantile(0.95)}s, {errors} errors")
+    embed.add_field(name="Commands", value='\n'.join(command_lines[:10]) or 'None', inline=False)
+    endpoint_lines = []
+    for labels, histogram in sorted(metrics.histograms_named("isb_roblox_request_seconds").items(), key=lambda item: -item[1].count):
+        endpoint = dict(labels)["endpoint"]
+        throttled = metrics.counters.get(("isb_roblox_throttled_total", metrics.label_key({"endpoint": endpoint})), 0)
+        endpoint_lines.append(f"{endpoint}: {histogram.count} calls, p95 {histogram.quantile(0.95)}s, {throttled} x 429")
+    embed.add_field(name="Roblox Endpoints", value='\n'.join(endpoint_lines[:10])[:1024] or 'None', inline=False)
+    lag = metrics.histograms.get(("isb_event_loop_lag_seconds", ()))
+    if lag is not None:
+        embed.add_field(name="Event Loop Lag", value=f"p99 {lag.quantile(0.99)}s, max {lag.max:.3f}s", inline=True)
+    chart = metrics.histograms.get(("isb_chart_render_seconds", ()))
+    if chart is not None:
+        embed.add_field(name="Chart Renders", value=f"{chart.count} renders, p95 {chart.quantile(0.95)}s", inline=True)
+    cache_stats = roblox.cache.stats()
+    embed.add_field(name="Roblox Cache", value=f"{cache_stats['entries']} entries, hit rate {cache_stats['hit_rate']:.0%}", inline=True)
+    embed.set_footer(text="Information extracted from ISB database.")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    record_command_metrics(interaction)
+
 # --- on_ready event and guild sync ---
 @bot.event
 async def on_ready():
     print(f"Bot logged in as {bot.user} (ID: {bot.user.id})")
+    for guild in bot.guilds:
+        await member_index.index.build_guild(guild)
+    if not bot.is_primary():
+        return
     try:
+        # on_ready also fires on reconnects; only sync when the commands changed
+        synced = await sync_commands()
+        if synced is None:
+            print("Command tree unchanged since the last sync, skipping sync.")
+            return
         if USE_GLOBAL_SYNC:
-            synced = await bot.tree.sync()
             print(f"Successfully synced {len(synced)} command(s) globally.")
         else:
-            guild = discord.Object(id=YOUR_GUILD_ID_HERE)
-            synced = await bot.tree.sync(guild=guild)
-            print(f"Successfully synced {len(synced)} command(s) to guild {guild.id}.")
+            print(f"Successfully synced {len(synced)} command(s) to guild {YOUR_GUILD_ID_HERE}.")
         if len(synced) == 0:
             print("Warning: No commands synced. Check permissions, guild ID, and bot presence in the guild.")
     except Exception as e:
         print(f"Failed to sync commands on ready: {e}. Ensure bot has permissions and is in the guild.")
 
+# --- Member search index events ---
+@bot.event
+async def on_guild_join(guild):
+    await member_index.index.build_guild(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    member_index.index.drop_guild(guild.id)
+
+@bot.event
+async def on_member_join(member):
+    member_index.index.add_member(member)
+
+@bot.event
+async def on_member_remove(member):
+    member_index.index.remove_member(member)
+
+@bot.event
+async def on_member_update(before, after):
+    if before.name != after.name or before.display_name != after.display_name:
+        member_index.index.add_member(after)
+
+@bot.event
+async def on_user_update(before, after):
+    if before.name != after.name or before.global_name != after.global_name:
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                member_index.index.add_member(member)
+
 # --- Run the bot ---
-bot.run(os.environ.get('TOKEN'))
+if __name__ == "__main__":
+    bot.run(os.environ.get('TOKEN'))
 
 
@@ -0,0 +1,162 @@
+import asyncio
+import bisect
+import unicodedata
+
+# In-memory member search index, kept current from gateway member events.
+# Substring queries use trigram postings; shorter queries use a sorted
+# prefix list.
+NGRAM = 3
+PREFIX_CANDIDATES = 200  # most members a short (prefix) query examines
+BUILD_CHUNK = 2000  # members indexed between yields to the event loop
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+def trigrams(key):
+    return {key[i:i + NGRAM] for i in range(len(key) - NGRAM + 1)}
+
+def match_rank(query, name_key, display_key):
+    # Lower is better; None if the member does not match
+    if query == name_key:
+        return 0
+    if query == display_key:
+        return 1
+    if name_key.startswith(query):
+        return 2
+    if display_key.startswith(query):
+        return 3
+    if query in name_key or query in display_key:
+        return 4
+    return None
+
+class GuildIndex:
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.keys = {}  # member id -> (name_key, display_key)
+        self.postings = {}  # trigram -> set of member ids
+        self.sorted_keys = []  # (key, member id) for prefix lookup
+        self.building = False  # sorted_keys is unsorted until finish_build()
+
+    def add(self, member_id, name, display_name):
+        if member_id in self.keys:
+            self.remove(member_id)
+        name_key, display_key = normalize(name), normalize(display_name)
+        self.keys[member_id] = (name_key, display_key)
+        for gram in trigrams(name_key) | trigrams(display_key):
+            self.postings.setdefault(gram, set()).add(member_id)
+        for key in {name_key, display_key}:
+            if self.building:
+                self.sorted_keys.append((key, member_id))
+            else:
+                bisect.insort(self.sorted_keys, (key, member_id))
+
+    def remove(self, member_id):
+        keys = self.keys.pop(member_id, None)
+        if keys is None:
+            return
+        for gram in trigrams(keys[0]) | trigrams(keys[1]):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(member_id)
+                if not ids:
+                    del self.postings[gram]
+        if self.building:
+            return  # stale prefix entries are dropped by finish_build()
+        for key in set(keys):
+            i = bisect.bisect_left(self.sorted_keys, (key, member_id))
+            if i < len(self.sorted_keys) and self.sorted_keys[i] == (key, member_id):
+                del self.sorted_keys[i]
+
+    def finish_build(self):
+        # One sort for the whole guild instead of an insort per member; also
+        # drops entries of members removed or renamed while building
+        self.sorted_keys = sorted({(key, member_id) for key, member_id in self.sorted_keys
+                                   if member_id in self.keys and key in self.keys[member_id]})
+        self.building = False
+
+    def candidates(self, query):
+        if len(query) < NGRAM:
+            # Exact matches sort first, so capping the prefix range keeps them
+            ids = set()
+            i = bisect.bisect_left(self.sorted_keys, (query,))
+            while i < len(self.sorted_keys) and self.sorted_keys[i][0].startswith(query) and len(ids) < PREFIX_CANDIDATES:
+                ids.add(self.sorted_keys[i][1])
+                i += 1
+            return ids
+        postings = []
+        for gram in trigrams(query):
+            ids = self.postings.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def search(self, query, limit=5):
+        # List of (rank, name_key, member id), best first
+        query = normalize(query)
+        if not query:
+            return []
+        ranked = []
+        for member_id in self.candidates(query):
+            keys = self.keys.get(member_id)
+            if keys is None:
+                continue
+            name_key, display_key = keys
+            rank = match_rank(query, name_key, display_key)
+            if rank is not None:
+                ranked.append((rank, len(name_key), name_key, member_id))
+        ranked.sort()
+        return [(rank, name_key, member_id) for rank, _, name_key, member_id in ranked[:limit]]
+
+class MemberIndex:
+    def __init__(self):
+        self.guilds = {}
+
+    async def build_guild(self, guild):
+        # Yields to the event loop between chunks so large guilds do not stall
+        # the gateway; member events that arrive meanwhile go to the new index
+        index = GuildIndex(guild.id)
+        index.building = True
+        self.guilds[guild.id] = index
+        for i, member in enumerate(guild.members):
+            index.add(member.id, member.name, member.display_name)
+            if i % BUILD_CHUNK == BUILD_CHUNK - 1:
+                await asyncio.sleep(0)
+        index.finish_build()
+
+    def drop_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    def add_member(self, member):
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member.id, member.name, member.display_name)
+
+    def remove_member(self, member):
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+
+    def search(self, bot, query, guild_id=None, limit=5):
+        # Members ranked by match quality; across all guilds unless guild_id is given
+        indexes = [self.guilds[guild_id]] if guild_id in self.guilds else [] if guild_id else list(self.guilds.values())
+        ranked = []
+        for index in indexes:
+            ranked.extend((rank, name_key, member_id, index.guild_id) for rank, name_key, member_id in index.search(query, limit))
+        ranked.sort()
+        members = []
+        seen = set()
+        for rank, name_key, member_id, index_guild_id in ranked:
+            if member_id in seen:
+                continue
+            guild = bot.get_guild(index_guild_id)
+            member = guild.get_member(member_id) if guild else None
+            if member is not None:
+                seen.add(member_id)
+                members.append(member)
+            if len(members) >= limit:
+                break
+        return members
+
+index = MemberIndex()
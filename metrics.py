@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+# In-process counters, gauges and histograms for commands, Roblox calls and
+# the event loop. Exposed as Prometheus text on METRICS_PORT (localhost only)
+# and/or dumped as JSON to METRICS_DUMP_PATH.
+METRICS_PORT = os.environ.get("METRICS_PORT")
+METRICS_DUMP_PATH = os.environ.get("METRICS_DUMP_PATH")
+METRICS_DUMP_INTERVAL = 60
+LOOP_LAG_INTERVAL = 0.5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PAGE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.max
+
+counters = {}  # (name, labels) -> value
+gauges = {}
+histograms = {}
+collectors = []  # callables run before export, e.g. to refresh cache gauges
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    key = (name, label_key(labels))
+    counters[key] = counters.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    gauges[(name, label_key(labels))] = value
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, label_key(labels))
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = Histogram(buckets)
+    histogram.observe(value)
+
+def endpoint_label(url):
+    parts = urlsplit(url)
+    return parts.netloc.split(".")[0] + re.sub(r"/\d+", "/{id}", parts.path)
+
+# --- Recording helpers ---
+
+def record_command(command, seconds, error=False):
+    inc("isb_commands_total", command=command, status="error" if error else "ok")
+    observe("isb_command_seconds", seconds, command=command)
+
+def record_upstream(url, status, seconds):
+    endpoint = endpoint_label(url)
+    inc("isb_roblox_requests_total", endpoint=endpoint, status=str(status))
+    observe("isb_roblox_request_seconds", seconds, endpoint=endpoint)
+    if status == 429:
+        inc("isb_roblox_throttled_total", endpoint=endpoint)
+    elif status != 200:
+        inc("isb_roblox_errors_total", endpoint=endpoint)
+
+def record_pages(loop_name, pages):
+    observe("isb_pagination_pages", pages, buckets=PAGE_BUCKETS, loop=loop_name)
+
+class timed:
+    # Context manager observing the block's duration into a latency histogram
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+# --- Export ---
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def run_collectors():
+    for collector in collectors:
+        try:
+            collector()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")  # Log for debugging
+
+def render_prometheus():
+    run_collectors()
+    lines = []
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    run_collectors()
+    def label_str(labels):
+        return ",".join(f"{k}={v}" for k, v in labels)
+    return {
+        "timestamp": time.time(),
+        "counters": {f"{name}{{{label_str(labels)}}}": value for (name, labels), value in counters.items()},
+        "gauges": {f"{name}{{{label_str(labels)}}}": value for (name, labels), value in gauges.items()},
+        "histograms": {
+            f"{name}{{{label_str(labels)}}}": {
+                "count": h.count, "sum": round(h.sum, 6), "max": round(h.max, 6),
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)
+            }
+            for (name, labels), h in histograms.items()
+        },
+    }
+
+def histograms_named(name):
+    # {label dict as tuple: Histogram} for one metric name
+    return {labels: h for (metric, labels), h in histograms.items() if metric == name}
+
+# --- Background tasks ---
+
+async def monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(loop.time() - started - LOOP_LAG_INTERVAL, 0.0)
+        observe("isb_event_loop_lag_seconds", lag)
+        set_gauge("isb_event_loop_lag_last_seconds", round(lag, 6))
+
+async def dump_loop(path):
+    while True:
+        await asyncio.sleep(METRICS_DUMP_INTERVAL)
+        data = json.dumps(snapshot())
+        await asyncio.to_thread(write_file, path, data)
+
+def write_file(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+async def start_server(port):
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=render_prometheus(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    print(f"Metrics endpoint listening on http://127.0.0.1:{port}/metrics")
+
+_tasks = []
+
+async def start():
+    if _tasks:
+        return
+    _tasks.append(asyncio.ensure_future(monitor_loop_lag()))
+    if METRICS_DUMP_PATH:
+        _tasks.append(asyncio.ensure_future(dump_loop(METRICS_DUMP_PATH)))
+    if METRICS_PORT:
+        try:
+            await start_server(int(METRICS_PORT))
+        except Exception as e:
+            print(f"Failed to start metrics endpoint: {e}")
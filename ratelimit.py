@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import heapq
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+# Per-host token buckets shared by every Roblox request. Waiters are served by
+# priority, so interactive commands jump ahead of background crawls.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# host -> (tokens per second, burst capacity)
+HOST_LIMITS = {
+    "groups.roblox.com": (5, 10),
+    "users.roblox.com": (5, 10),
+    "friends.roblox.com": (3, 6),
+    "badges.roblox.com": (5, 10),
+}
+DEFAULT_LIMIT = (5, 10)
+
+# Fraction of the limits above this process may spend. Processes behind one
+# IP (shards, crawl workers) split Roblox's budget; sharded.py sets this.
+RATE_SHARE = float(os.environ.get("ROBLOX_RATE_SHARE") or 1 / (1 + int(os.environ.get("CRAWL_WORKERS") or 0)))
+
+def scale_limits(share):
+    # Must run before the first request creates a bucket
+    global HOST_LIMITS, DEFAULT_LIMIT
+    HOST_LIMITS = {host: (rate * share, max(capacity * share, 1)) for host, (rate, capacity) in HOST_LIMITS.items()}
+    DEFAULT_LIMIT = (DEFAULT_LIMIT[0] * share, max(DEFAULT_LIMIT[1] * share, 1))
+
+if RATE_SHARE != 1:
+    scale_limits(RATE_SHARE)
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+current_priority = contextvars.ContextVar("roblox_priority", default=INTERACTIVE)
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters = []  # heap of (priority, seq, future)
+        self.seq = 0
+        self._drainer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority=None):
+        if priority is None:
+            priority = current_priority.get()
+        self._refill()
+        if not self.waiters and self.tokens >= 1 and time.monotonic() >= self.blocked_until:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, self.seq, future))
+        self.seq += 1
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.ensure_future(self._drain())
+        await future
+
+    async def _drain(self):
+        while self.waiters:
+            if self.waiters[0][2].cancelled():
+                heapq.heappop(self.waiters)
+                continue
+            self._refill()
+            delay = self.blocked_until - time.monotonic()
+            if self.tokens < 1:
+                delay = max(delay, (1 - self.tokens) / self.rate)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            priority, seq, future = heapq.heappop(self.waiters)
+            self.tokens -= 1
+            future.set_result(None)
+
+    def penalize(self, delay):
+        # Pause the whole host, e.g. after a 429 with Retry-After
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+_buckets = {}
+
+def bucket_for(url):
+    host = urlsplit(url).netloc
+    bucket = _buckets.get(host)
+    if bucket is None:
+        bucket = _buckets[host] = TokenBucket(*HOST_LIMITS.get(host, DEFAULT_LIMIT))
+    return bucket
+
+def retry_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.8, 1.2)
+
+def background_task(coro):
+    # Schedules coro with background priority for all of its Roblox requests
+    context = contextvars.copy_context()
+    context.run(current_priority.set, BACKGROUND)
+    return asyncio.get_running_loop().create_task(coro, context=context)
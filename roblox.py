@@ -0,0 +1,548 @@
+import asyncio
+import os
+import time
+import aiohttp
+from array import array
+from bisect import bisect_left
+from contextlib import aclosing
+from datetime import datetime, timezone
+import metrics
+import ratelimit
+import shared_cache
+from cache import TTLCache, TTLS
+
+# Shared connection-pooled HTTP session for every Roblox endpoint.
+# Created lazily so it binds to the running event loop.
+REQUEST_TIMEOUT = 10
+MAX_CONNECTIONS = 50
+# Users scanned at once by scan_profiles
+SCAN_CONCURRENCY = 8
+USERS_BATCH_SIZE = 100
+# Network budget per attempt for the single lookups fanned out by get_user_profile;
+# time queued on the token bucket and retry backoff do not count against it
+CALL_TIMEOUT = 8
+# Overall deadline for each optional get_user_profile lookup, retries and backoff
+# included, so a struggling endpoint costs one slow call rather than five
+OPTIONAL_DEADLINE = 12
+# Points every Roblox host at a stand-in server, e.g. "http://127.0.0.1:8080"
+# serves https://groups.roblox.com/... from http://127.0.0.1:8080/groups.roblox.com/...
+API_BASE_OVERRIDE = os.environ.get("ROBLOX_API_BASE")
+
+_session = None
+
+# Shared TTL/LRU cache in front of the fetchers, keyed by (kind, endpoint/id)
+cache = TTLCache()
+scan_semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def resolve_url(url):
+    return url.replace("https://", API_BASE_OVERRIDE.rstrip("/") + "/", 1) if API_BASE_OVERRIDE else url
+
+async def request_json(method, url, timeout=None, **kwargs):
+    # Returns (status, data); data is None for non-200 responses. Every attempt
+    # waits on the host's token bucket; 429s, 5xx, connection errors and
+    # timeouts are retried with backoff. timeout bounds each attempt's network time.
+    bucket = ratelimit.bucket_for(url)
+    endpoint = metrics.endpoint_label(url)
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+    for attempt in range(ratelimit.MAX_RETRIES + 1):
+        with metrics.timed("isb_roblox_queue_seconds", endpoint=endpoint):
+            await bucket.acquire()
+        started = time.perf_counter()
+        try:
+            async with get_session().request(method, resolve_url(url), **kwargs) as response:
+                status = response.status
+                if status == 200:
+                    data = await response.json(content_type=None)
+                    metrics.record_upstream(url, status, time.perf_counter() - started)
+                    return status, data
+                retry_after = response.headers.get("Retry-After")
+            metrics.record_upstream(url, status, time.perf_counter() - started)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Connection failures and timeouts have no status; count them so outages show up
+            metrics.record_upstream(url, "exception", time.perf_counter() - started)
+            if attempt == ratelimit.MAX_RETRIES:
+                raise
+            status, retry_after = None, None
+        else:
+            if status not in ratelimit.RETRY_STATUSES or attempt == ratelimit.MAX_RETRIES:
+                return status, None
+        delay = ratelimit.retry_delay(attempt, retry_after)
+        metrics.inc("isb_roblox_retries_total", endpoint=endpoint)
+        if status == 429:
+            bucket.penalize(delay)
+        await asyncio.sleep(delay)
+
+async def fetch_json(url, params=None, timeout=None):
+    return await request_json("GET", url, params=params, timeout=timeout)
+
+async def post_json(url, payload):
+    return await request_json("POST", url, json=payload)
+
+class RobloxAPIError(Exception):
+    def __init__(self, message, cursor=None):
+        super().__init__(message)
+        self.cursor = cursor  # cursor of the page that failed, for resuming
+
+def is_result(value):
+    # Error strings are never cached
+    return not isinstance(value, str)
+
+async def cached(kind, key, fetch, should_cache=is_result):
+    if shared_cache.enabled(kind):
+        fetch = shared_cache.through(kind, key, TTLS[kind], fetch, should_cache)
+    return await cache.get_or_fetch((kind, key), TTLS[kind], fetch, should_cache)
+
+def parse_roblox_date(value):
+    return datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc) if value else None
+
+# --- Roblox API Functions ---
+
+async def get_group_members_with_ranks(group_id):
+    return await cached("roster", group_id, lambda: fetch_group_members(group_id))
+
+async def iter_group_member_pages(group_id, cursor=None):
+    # Yields one list of (user_id, username, rank_name, rank_num) per roster page;
+    # pass the cursor from a failed crawl's RobloxAPIError to resume it
+    url = f"https://groups.roblox.com/v1/groups/{group_id}/users"
+    params = {"sortOrder": "Asc", "limit": 100}
+    if cursor:
+        params["cursor"] = cursor
+    pages = 0
+    try:
+        while True:
+            try:
+                status, data = await fetch_json(url, params)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RobloxAPIError(f"Network error fetching members for group {group_id}: {e!r}", params.get("cursor")) from e
+            if status != 200:
+                raise RobloxAPIError(f"Error fetching members for group {group_id}: {status}", params.get("cursor"))
+            pages += 1
+            page = []
+            for user_data in data.get("data", []):
+                user = user_data["user"]
+                role = user_data.get("role", {})
+                page.append((user.get("userId"), user["username"], role.get("name", "Unknown"), role.get("rank", "Unknown")))
+            yield page
+            next_page_cursor = data.get("nextPageCursor")
+            if not next_page_cursor:
+                break
+            params["cursor"] = next_page_cursor
+    finally:
+        metrics.record_pages("group_members", pages)
+
+async def fetch_group_members(group_id):
+    members = {}
+    try:
+        async for page in iter_group_member_pages(group_id):
+            for user_id, username, rank_name, rank_num in page:
+                members[username] = {"rank_name": rank_name, "rank_num": rank_num}
+    except RobloxAPIError as e:
+        return str(e)
+    except Exception as e:
+        return f"Network or other error fetching group {group_id}: {e}"
+    return members
+
+async def get_group_member_count(group_id):
+    status, data = await fetch_json(f"https://groups.roblox.com/v1/groups/{group_id}")
+    if status != 200:
+        raise RobloxAPIError(f"Error fetching group {group_id}: {status}")
+    return data.get("memberCount", 0)
+
+async def build_member_index(group_id):
+    # Sorted array of (user_id << 16 | rank index) plus the interned rank table
+    ranks = {}
+    packed = array("q")
+    async for page in iter_group_member_pages(group_id):
+        for user_id, username, rank_name, rank_num in page:
+            rank_index = ranks.setdefault((rank_name, rank_num), len(ranks))
+            packed.append(user_id << 16 | rank_index)
+    packed = array("q", sorted(packed))
+    rank_table = [None] * len(ranks)
+    for rank, rank_index in ranks.items():
+        rank_table[rank_index] = rank
+    return packed, rank_table
+
+async def intersect_group_members(group_id_1, group_id_2):
+    # Indexes the smaller group, then streams the larger one page by page against it,
+    # so peak memory scales with the smaller group and the overlap. Returns a list of
+    # (username, rank_name_1, rank_num_1, rank_name_2, rank_num_2) or an error string.
+    try:
+        count_1, count_2 = await asyncio.gather(get_group_member_count(group_id_1), get_group_member_count(group_id_2))
+        swapped = count_2 < count_1
+        small_id, large_id = (group_id_2, group_id_1) if swapped else (group_id_1, group_id_2)
+        packed, rank_table = await build_member_index(small_id)
+        matches = []
+        large_ranks = {}
+        async for page in iter_group_member_pages(large_id):
+            for user_id, username, rank_name, rank_num in page:
+                i = bisect_left(packed, user_id << 16)
+                if i < len(packed) and packed[i] >> 16 == user_id:
+                    small_rank = rank_table[packed[i] & 0xFFFF]
+                    large_rank = large_ranks.setdefault((rank_name, rank_num), (rank_name, rank_num))
+                    rank_1, rank_2 = (large_rank, small_rank) if swapped else (small_rank, large_rank)
+                    matches.append((username, *rank_1, *rank_2))
+    except RobloxAPIError as e:
+        return str(e)
+    except Exception as e:
+        return f"Network or other error intersecting groups {group_id_1} and {group_id_2}: {e}"
+    matches.sort(key=lambda match: match[0].casefold())
+    return matches
+
+async def get_count(url):
+    return await cached("counts", url, lambda: fetch_count(url))
+
+async def fetch_count(url):
+    # "Unknown" (never cached) when the count cannot be fetched, so the risk
+    # factor built on it is skipped rather than scored as zero
+    try:
+        status, data = await fetch_json(url, timeout=CALL_TIMEOUT)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Count fetch error for {url}: {e!r}")  # Log for debugging
+        return "Unknown"
+    return data.get("count", 0) if data else "Unknown"
+
+async def get_user_info(user_id):
+    url = f"https://users.roblox.com/v1/users/{user_id}"
+    return await cached("profile", user_id, lambda: fetch_json(url, timeout=CALL_TIMEOUT), lambda result: result[0] == 200)
+
+async def optional(lookup):
+    # On expiry the feature becomes "Unknown"; a cached fetch keeps running and fills the cache
+    async with asyncio.timeout(OPTIONAL_DEADLINE):
+        return await lookup
+
+def known(value, what, user_id):
+    # Optional lookups that raised become "Unknown" features instead of failing the profile
+    if isinstance(value, BaseException):
+        print(f"{what} lookup error for user {user_id}: {value!r}")  # Log for debugging
+        return "Unknown"
+    return value
+
+async def iter_user_badges(user_id, page_size=100):
+    # Single streaming badge pipeline; pages are cursor-dependent, so they stay sequential
+    url = f"https://badges.roblox.com/v1/users/{user_id}/badges"
+    params = {"limit": page_size}
+    pages = 0
+    try:
+        while True:
+            status, data = await fetch_json(url, params)
+            if status != 200:
+                raise RobloxAPIError(f"Error fetching badges: {status}")
+            pages += 1
+            for badge in data.get("data", []):
+                yield {"name": badge.get("name", "Unknown"), "date": parse_roblox_date(badge.get("awardedDate"))}
+            next_cursor = data.get("nextPageCursor")
+            if not next_cursor:
+                break
+            params["cursor"] = next_cursor
+    finally:
+        metrics.record_pages("user_badges", pages)
+
+async def get_user_badges_full(user_id):
+    return await cached("badges", user_id, lambda: fetch_user_badges_full(user_id))
+
+async def fetch_user_badges_full(user_id):
+    badges = []
+    try:
+        async for badge in iter_user_badges(user_id):
+            badges.append(badge)
+    except RobloxAPIError as e:
+        return str(e)
+    except Exception as e:
+        print(f"Badges fetch error for user {user_id}: {e}")  # Log for debugging
+        return "Unable to retrieve badge data. Please check the User ID."
+    return badges
+
+async def count_badges(user_id, stop_at=None):
+    # Stops streaming once stop_at badges are seen, for threshold-only callers
+    badges = cache.get(("badges", user_id))
+    if badges is not None:
+        return len(badges) if stop_at is None else min(len(badges), stop_at)
+    if stop_at is None:
+        badges = await get_user_badges_full(user_id)
+        if isinstance(badges, str):
+            raise RobloxAPIError(badges)
+        return len(badges)
+    count = 0
+    async with aclosing(iter_user_badges(user_id, 10 if stop_at <= 10 else 100)) as badges:
+        async for _ in badges:
+            count += 1
+            if count >= stop_at:
+                break
+    return count
+
+def risk_model():
+    # scoring pulls in NumPy, so it is imported on first use rather than at startup
+    import scoring
+    return scoring.model
+
+def apply_risk(records):
+    # Scores every error-free record in one vectorized pass and merges the
+    # level, score and per-factor explanation into it
+    scorable = [record for record in records if "error" not in record]
+    for record, result in zip(scorable, risk_model().explain(scorable)):
+        record.update(result)
+    return records
+
+async def get_user_profile(user_id):
+    try:
+        # The user lookup, the three counts and the badge crawl are independent,
+        # so run them concurrently; a failed count or badge crawl only leaves
+        # that feature unknown
+        user_result, friends_count, followers_count, following_count, badges = await asyncio.gather(
+            get_user_info(user_id),
+            optional(get_count(f"https://friends.roblox.com/v1/users/{user_id}/friends/count")),
+            optional(get_count(f"https://friends.roblox.com/v1/users/{user_id}/followers/count")),
+            optional(get_count(f"https://friends.roblox.com/v1/users/{user_id}/followings/count")),
+            optional(get_user_badges_full(user_id)),
+            return_exceptions=True
+        )
+        if isinstance(user_result, BaseException):
+            raise user_result
+        status, user_data = user_result
+        if status != 200:
+            return f"Error fetching user info: {status}"
+        username = user_data.get("name", "Unknown")
+        display_name = user_data.get("displayName", "Unknown")
+        description = user_data.get("description", "No description")
+        created = user_data.get("created", "Unknown")
+        join_date = parse_roblox_date(created) if created != "Unknown" else None
+        account_age_days = (datetime.now(timezone.utc) - join_date).days if join_date else "Unknown"
+        friends_count = known(friends_count, "Friends count", user_id)
+        followers_count = known(followers_count, "Followers count", user_id)
+        following_count = known(following_count, "Followings count", user_id)
+        badges = known(badges, "Badge", user_id)
+        badges_known = not isinstance(badges, str)
+        if not badges_known:
+            badges = []
+        profile = {
+            "username": username,
+            "display_name": display_name,
+            "description": description,
+            "join_date": created,
+            "account_age_days": account_age_days,
+            "friends_count": friends_count,
+            "followers_count": followers_count,
+            "following_count": following_count,
+            "total_badges": len(badges) if badges_known else "Unknown",
+            "badges_list": [badge["name"] for badge in badges[:20]],
+            "badge_rate": risk_model().badge_rate(badges) if badges_known else "Unknown"
+        }
+        return apply_risk([profile])[0]
+    except Exception as e:
+        print(f"Profile fetch error for user {user_id}: {e!r}")  # Log for debugging
+        return "Unable to retrieve profile data. Please check the User ID."
+
+async def get_user_groups(user_id):
+    return await cached("groups", user_id, lambda: fetch_user_groups(user_id))
+
+async def fetch_user_groups(user_id):
+    groups = []
+    try:
+        async for page in iter_pages(f"https://groups.roblox.com/v1/users/{user_id}/groups"):
+            for group in page:
+                groups.append({
+                    "id": group["group"]["id"],
+                    "name": group["group"]["name"],
+                    "rank": group["role"]["name"],
+                    "rank_num": group["role"]["rank"]
+                })
+    except RobloxAPIError as e:
+        return str(e)
+    except Exception as e:
+        return f"Network error fetching groups: {e}"
+    return groups
+
+async def get_user_friend_ids(user_id):
+    return await cached("friends", user_id, lambda: fetch_user_friend_ids(user_id))
+
+async def fetch_user_friend_ids(user_id):
+    friend_ids = []
+    try:
+        async for page in iter_pages(f"https://friends.roblox.com/v1/users/{user_id}/friends"):
+            friend_ids.extend(friend["id"] for friend in page if friend.get("id") is not None)
+    except RobloxAPIError as e:
+        return str(e)
+    except Exception as e:
+        return f"Network error fetching friends: {e}"
+    return friend_ids
+
+async def iter_pages(url, page_size=100):
+    # Yields the "data" list of every page, following nextPageCursor when present
+    params = {"limit": page_size}
+    pages = 0
+    try:
+        while True:
+            status, data = await fetch_json(url, params)
+            if status != 200:
+                raise RobloxAPIError(f"Error fetching {url}: {status}")
+            pages += 1
+            yield data.get("data", [])
+            next_cursor = data.get("nextPageCursor")
+            if not next_cursor:
+                break
+            params["cursor"] = next_cursor
+    finally:
+        metrics.record_pages(metrics.endpoint_label(url), pages)
+
+class Comparison:
+    # Incremental id-based intersection of two users' friends, followings and groups
+    def __init__(self):
+        self.seen = {kind: (set(), set()) for kind in ("friends", "followings", "groups")}
+        self.common = {kind: {} for kind in ("friends", "followings", "groups")}
+        self.score = 0
+        self.error = None
+        self.high = asyncio.Event()
+
+    def add(self, kind, side, entries):
+        mine, other = self.seen[kind][side], self.seen[kind][1 - side]
+        common = self.common[kind]
+        for entry_id, name in entries:
+            mine.add(entry_id)
+            if entry_id in other and entry_id not in common:
+                common[entry_id] = name
+                self.score += 1
+        if self.score >= risk_model().commonality_high:
+            self.high.set()
+
+async def stream_connections(comparison, kind, side, url):
+    async for page in iter_pages(url):
+        comparison.add(kind, side, [(f["id"], f.get("name") or f.get("displayName") or str(f["id"])) for f in page if f.get("id") is not None])
+
+async def stream_groups(comparison, side, user_id):
+    groups = await get_user_groups(user_id)
+    if isinstance(groups, str):
+        comparison.error = "Unable to retrieve group data for comparison. Please check the User IDs."
+        raise RobloxAPIError(groups)
+    comparison.add("groups", side, [(g["id"], g["name"]) for g in groups])
+
+async def compare_users(user_id_1, user_id_2, threat_only=False):
+    # Streams every page for both users concurrently; with threat_only the
+    # crawl stops as soon as the score passes the "High" threshold
+    comparison = Comparison()
+    tasks = []
+    for side, user_id in enumerate((user_id_1, user_id_2)):
+        tasks.append(asyncio.ensure_future(stream_connections(comparison, "friends", side, f"https://friends.roblox.com/v1/users/{user_id}/friends")))
+        tasks.append(asyncio.ensure_future(stream_connections(comparison, "followings", side, f"https://friends.roblox.com/v1/users/{user_id}/followings")))
+        tasks.append(asyncio.ensure_future(stream_groups(comparison, side, user_id)))
+    crawl = asyncio.gather(*tasks)
+    crawl.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        if threat_only:
+            high = asyncio.ensure_future(comparison.high.wait())
+            await asyncio.wait([crawl, high], return_when=asyncio.FIRST_COMPLETED)
+            high.cancel()
+            if not comparison.high.is_set():
+                await crawl
+        else:
+            await crawl
+    except Exception as e:
+        print(f"Comparison error for users {user_id_1} and {user_id_2}: {e}")  # Log for debugging
+        return comparison.error or "Unable to perform comparison. Please check the User IDs."
+    finally:
+        for task in tasks:
+            task.cancel()
+    return {
+        "common_friends": list(comparison.common["friends"].values()),
+        "common_followers": list(comparison.common["followings"].values()),
+        "common_groups": list(comparison.common["groups"].values()),
+        "commonality_score": comparison.score,
+        "threat_level": risk_model().commonality_threat(comparison.score)
+    }
+
+async def get_users_batch(user_ids):
+    # Resolves many ids with the users/v1/users batch endpoint; unknown ids are left out
+    users = {}
+    for i in range(0, len(user_ids), USERS_BATCH_SIZE):
+        chunk = user_ids[i:i + USERS_BATCH_SIZE]
+        status, data = await post_json("https://users.roblox.com/v1/users", {"userIds": chunk, "excludeBannedUsers": False})
+        if status != 200:
+            raise RobloxAPIError(f"Error resolving users: {status}")
+        for user in data.get("data", []):
+            users[user["id"]] = user
+    return users
+
+# Risk features served by the friends host's count endpoints
+COUNT_FEATURES = {"friends_count": "friends", "followers_count": "followers", "following_count": "followings"}
+
+async def unknown():
+    return "Unknown"
+
+async def scan_user(user_id, username):
+    # Risk features only, scored later by scan_profiles; only the features the
+    # risk model uses are fetched. The badge crawl stops once it reaches the
+    # largest "few badges" threshold, unless a badge_rate factor needs the
+    # full list of award dates.
+    model = risk_model()
+    counts = [feature for feature in COUNT_FEATURES if model.uses(feature)]
+    try:
+        async with scan_semaphore:
+            if not (model.uses("total_badges") or model.uses("badge_rate")):
+                badge_lookup = unknown()
+            elif model.badge_stop_at() is None:
+                badge_lookup = get_user_badges_full(user_id)
+            else:
+                badge_lookup = count_badges(user_id, stop_at=model.badge_stop_at())
+            user_result, badges, *count_results = await asyncio.gather(
+                get_user_info(user_id),
+                badge_lookup,
+                *(get_count(f"https://friends.roblox.com/v1/users/{user_id}/{COUNT_FEATURES[feature]}/count") for feature in counts),
+                return_exceptions=True
+            )
+        if isinstance(user_result, BaseException):
+            raise user_result
+        status, user_data = user_result
+        if status != 200:
+            return {"user_id": user_id, "username": username, "error": f"Error fetching user info: {status}"}
+        join_date = parse_roblox_date(user_data.get("created"))
+        account_age_days = (datetime.now(timezone.utc) - join_date).days if join_date else "Unknown"
+        badges = known(badges, "Badge", user_id)
+        if isinstance(badges, list):
+            total_badges, badge_rate = len(badges), model.badge_rate(badges)
+        else:
+            total_badges, badge_rate = badges if isinstance(badges, int) else "Unknown", "Unknown"
+        record = {
+            "user_id": user_id,
+            "username": username,
+            "account_age_days": account_age_days,
+            "total_badges": total_badges,
+            "badge_rate": badge_rate
+        }
+        for feature, value in zip(counts, count_results):
+            record[feature] = known(value, feature.replace("_", " ").capitalize(), user_id)
+        return record
+    except Exception as e:
+        print(f"Scan error for user {user_id}: {e!r}")  # Log for debugging
+        return {"user_id": user_id, "username": username, "error": "Unable to retrieve profile data."}
+
+async def scan_profiles(user_ids):
+    # Yields one result per id as soon as it finishes, under SCAN_CONCURRENCY;
+    # whatever finished together is risk-scored as one batch
+    users = await get_users_batch(user_ids)
+    for user_id in user_ids:
+        if user_id not in users:
+            yield {"user_id": user_id, "username": "Unknown", "error": "User not found."}
+    tasks = [asyncio.ensure_future(scan_user(user_id, users[user_id]["name"])) for user_id in user_ids if user_id in users]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for result in apply_risk([task.result() for task in done]):
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
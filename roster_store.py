@@ -0,0 +1,439 @@
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+import crawl_pool
+import ratelimit
+import roblox
+
+# Persistent SQLite store of group rosters. Every group stored here is tracked
+# and re-crawled in the background once it goes stale, until nobody has
+# queried or watched it for UNUSED_AFTER.
+DB_PATH = os.environ.get("ISB_DB_PATH", "isb.sqlite3")
+REFRESH_INTERVAL = 15 * 60  # seconds between background refresh passes
+STALE_AFTER = 6 * 60 * 60  # roster age that triggers a refresh
+PARTIAL_TTL = 10 * 60  # how long an interrupted crawl can be resumed
+LEASE_TTL = 2 * 60  # a crawl that stops renewing its lease this long is presumed dead
+LEASE_POLL = 2  # seconds between checks while another process crawls the group
+STAGE_BATCH = 2000  # crawled rows buffered before they are written to staging
+CHANGE_RETENTION = 7 * 24 * 60 * 60  # how long roster diffs are kept
+CHANGE_PAGE = 500  # roster diffs read per query
+UNUSED_AFTER = 7 * 24 * 60 * 60  # groups left unused this long are no longer refreshed and are dropped
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_id INTEGER PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    member_count INTEGER NOT NULL,
+    last_used_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS members (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    rank_name TEXT,
+    rank_num INTEGER,
+    PRIMARY KEY (group_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS roster_staging (
+    group_id INTEGER NOT NULL,
+    crawl_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    rank_name TEXT,
+    rank_num INTEGER,
+    PRIMARY KEY (group_id, crawl_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS crawl_leases (
+    group_id INTEGER PRIMARY KEY,
+    crawl_id TEXT NOT NULL,
+    leased_until REAL NOT NULL,
+    cursor TEXT,
+    cursor_saved_at REAL
+);
+CREATE TABLE IF NOT EXISTS roster_changes (
+    group_id INTEGER NOT NULL,
+    changed_at REAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    old_rank_name TEXT,
+    old_rank_num INTEGER,
+    new_rank_name TEXT,
+    new_rank_num INTEGER
+);
+CREATE INDEX IF NOT EXISTS roster_changes_by_group ON roster_changes (group_id, changed_at);
+"""
+
+_initialized = False
+_refreshing = {}
+_refresher = None
+
+def connect():
+    global _initialized
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _initialized = True
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextmanager
+def immediate(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so a check and the writes
+    # that depend on it are atomic across processes
+    isolation_level, conn.isolation_level = conn.isolation_level, None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        conn.isolation_level = isolation_level
+
+# --- Blocking helpers (run via asyncio.to_thread) ---
+
+def _acquire_lease(group_id):
+    # Returns (crawl_id, resume_cursor), or None while another live crawl holds the group.
+    # A crawl that failed recently is adopted together with its staged rows.
+    now = time.time()
+    conn = connect()
+    try:
+        with immediate(conn):
+            row = conn.execute(
+                "SELECT crawl_id, leased_until, cursor, cursor_saved_at FROM crawl_leases WHERE group_id = ?", (group_id,)
+            ).fetchone()
+            if row and row[1] > now:
+                return None
+            if row and row[2] and now - row[3] <= PARTIAL_TTL:
+                crawl_id, cursor = row[0], row[2]
+            else:
+                crawl_id, cursor = uuid.uuid4().hex, None
+            conn.execute("DELETE FROM roster_staging WHERE group_id = ? AND crawl_id != ?", (group_id, crawl_id))
+            conn.execute(
+                "INSERT OR REPLACE INTO crawl_leases (group_id, crawl_id, leased_until, cursor, cursor_saved_at) VALUES (?, ?, ?, NULL, NULL)",
+                (group_id, crawl_id, now + LEASE_TTL)
+            )
+    finally:
+        conn.close()
+    return crawl_id, cursor
+
+def _release_lease(group_id, crawl_id, cursor):
+    # Keeps the failed page's cursor so the next crawl of the group can resume
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE crawl_leases SET leased_until = 0, cursor = ?, cursor_saved_at = ? WHERE group_id = ? AND crawl_id = ?",
+                (cursor, time.time(), group_id, crawl_id)
+            )
+    finally:
+        conn.close()
+
+def _stage_rows(group_id, crawl_id, rows):
+    # Crawled pages go to a staging table so a crawl never holds a whole roster in memory.
+    # Each write renews the lease; returns False if the lease was lost to another crawl.
+    conn = connect()
+    try:
+        with immediate(conn):
+            renewed = conn.execute(
+                "UPDATE crawl_leases SET leased_until = ? WHERE group_id = ? AND crawl_id = ?",
+                (time.time() + LEASE_TTL, group_id, crawl_id)
+            ).rowcount
+            if not renewed:
+                return False
+            conn.executemany(
+                "INSERT OR REPLACE INTO roster_staging (group_id, crawl_id, user_id, username, rank_name, rank_num) VALUES (?, ?, ?, ?, ?, ?)",
+                ((group_id, crawl_id, user_id, username, rank_name, rank_num) for user_id, username, rank_name, rank_num in rows)
+            )
+    finally:
+        conn.close()
+    return True
+
+def _promote_staging(group_id, crawl_id):
+    # Returns the refresh timestamp, or None if the lease was lost to another crawl
+    refreshed_at = time.time()
+    conn = connect()
+    try:
+        with immediate(conn):
+            if not conn.execute("SELECT 1 FROM crawl_leases WHERE group_id = ? AND crawl_id = ?", (group_id, crawl_id)).fetchone():
+                return None
+            if conn.execute("SELECT 1 FROM groups WHERE group_id = ?", (group_id,)).fetchone():
+                _record_changes(conn, group_id, crawl_id, refreshed_at)
+            conn.execute("DELETE FROM members WHERE group_id = ?", (group_id,))
+            conn.execute(
+                "INSERT INTO members (group_id, user_id, username, rank_name, rank_num) "
+                "SELECT group_id, user_id, username, rank_name, rank_num FROM roster_staging WHERE group_id = ? AND crawl_id = ?",
+                (group_id, crawl_id)
+            )
+            conn.execute("DELETE FROM roster_staging WHERE group_id = ?", (group_id,))
+            conn.execute("DELETE FROM crawl_leases WHERE group_id = ?", (group_id,))
+            member_count = conn.execute("SELECT COUNT(*) FROM members WHERE group_id = ?", (group_id,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO groups (group_id, refreshed_at, member_count, last_used_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (group_id) DO UPDATE SET refreshed_at = excluded.refreshed_at, member_count = excluded.member_count",
+                (group_id, refreshed_at, member_count, refreshed_at)
+            )
+    finally:
+        conn.close()
+    return refreshed_at
+
+def _record_changes(conn, group_id, crawl_id, changed_at):
+    # Diffs the previous roster against the staged one: joins, leaves and rank changes
+    conn.execute(
+        "INSERT INTO roster_changes SELECT ?, ?, s.user_id, s.username, 'joined', NULL, NULL, s.rank_name, s.rank_num "
+        "FROM roster_staging s LEFT JOIN members m ON m.group_id = s.group_id AND m.user_id = s.user_id "
+        "WHERE s.group_id = ? AND s.crawl_id = ? AND m.user_id IS NULL",
+        (group_id, changed_at, group_id, crawl_id)
+    )
+    conn.execute(
+        "INSERT INTO roster_changes SELECT ?, ?, m.user_id, m.username, 'left', m.rank_name, m.rank_num, NULL, NULL "
+        "FROM members m LEFT JOIN roster_staging s ON s.group_id = m.group_id AND s.crawl_id = ? AND s.user_id = m.user_id "
+        "WHERE m.group_id = ? AND s.user_id IS NULL",
+        (group_id, changed_at, crawl_id, group_id)
+    )
+    conn.execute(
+        "INSERT INTO roster_changes SELECT ?, ?, s.user_id, s.username, 'rank', m.rank_name, m.rank_num, s.rank_name, s.rank_num "
+        "FROM roster_staging s JOIN members m ON m.group_id = s.group_id AND m.user_id = s.user_id "
+        "WHERE s.group_id = ? AND s.crawl_id = ? AND m.rank_num IS NOT s.rank_num",
+        (group_id, changed_at, group_id, crawl_id)
+    )
+    conn.execute("DELETE FROM roster_changes WHERE changed_at < ?", (changed_at - CHANGE_RETENTION,))
+
+def _changes_since(group_id, since, after_rowid, limit):
+    # One page of diffs, keyed on rowid (insertion order) so paging never skips or repeats rows
+    conn = connect()
+    try:
+        return conn.execute(
+            "SELECT rowid, changed_at, user_id, username, kind, old_rank_name, old_rank_num, new_rank_name, new_rank_num "
+            "FROM roster_changes WHERE group_id = ? AND changed_at > ? AND rowid > ? ORDER BY rowid LIMIT ?",
+            (group_id, since, after_rowid, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def _member_count(group_id):
+    conn = connect()
+    try:
+        row = conn.execute("SELECT member_count FROM groups WHERE group_id = ?", (group_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _refreshed_at(group_id):
+    conn = connect()
+    try:
+        row = conn.execute("SELECT refreshed_at FROM groups WHERE group_id = ?", (group_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _mark_used(group_id):
+    # Records a query or watchlist poll; returns refreshed_at, or None if untracked
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("UPDATE groups SET last_used_at = ? WHERE group_id = ?", (time.time(), group_id))
+        row = conn.execute("SELECT refreshed_at FROM groups WHERE group_id = ?", (group_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _stale_groups(cutoff):
+    conn = connect()
+    try:
+        rows = conn.execute("SELECT group_id FROM groups WHERE refreshed_at < ?", (cutoff,)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+def _intersect(group_id_1, group_id_2):
+    conn = connect()
+    try:
+        return conn.execute(
+            "SELECT a.username, a.rank_name, a.rank_num, b.rank_name, b.rank_num "
+            "FROM members a JOIN members b ON b.group_id = ? AND b.user_id = a.user_id "
+            "WHERE a.group_id = ? ORDER BY a.username COLLATE NOCASE",
+            (group_id_2, group_id_1)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def _member_ids(conn, group_id):
+    # Sorted int64 ids, read straight off the (group_id, user_id) primary key
+    import numpy as np
+    rows = conn.execute("SELECT user_id FROM members WHERE group_id = ? ORDER BY user_id", (group_id,))
+    return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+def _overlap(group_ids, min_groups):
+    # Pairwise overlap counts (the diagonal holds roster sizes) and the members
+    # found in at least min_groups of the groups, with their rank in each
+    import numpy as np
+    conn = connect()
+    try:
+        rosters = [_member_ids(conn, group_id) for group_id in group_ids]
+        n = len(group_ids)
+        matrix = np.zeros((n, n), dtype=np.int64)
+        for i in range(n):
+            matrix[i, i] = rosters[i].size
+            for j in range(i + 1, n):
+                matrix[i, j] = matrix[j, i] = np.intersect1d(rosters[i], rosters[j], assume_unique=True).size
+        user_ids, counts = np.unique(np.concatenate(rosters), return_counts=True)
+        shared_ids = user_ids[counts >= min_groups]
+        shared = {int(user_id): [None, []] for user_id in shared_ids}
+        for group_id, roster in zip(group_ids, rosters):
+            in_group = shared_ids[np.isin(shared_ids, roster, assume_unique=True)].tolist()
+            for i in range(0, len(in_group), 500):
+                chunk = in_group[i:i + 500]
+                for user_id, username, rank_name, rank_num in conn.execute(
+                    "SELECT user_id, username, rank_name, rank_num FROM members "
+                    f"WHERE group_id = ? AND user_id IN ({','.join('?' * len(chunk))})",
+                    (group_id, *chunk)
+                ):
+                    entry = shared[user_id]
+                    entry[0] = username
+                    entry[1].append((group_id, rank_name, rank_num))
+    finally:
+        conn.close()
+    members = [(username, memberships) for username, memberships in shared.values()]
+    members.sort(key=lambda m: (-len(m[1]), m[0].casefold()))
+    return matrix.tolist(), members
+
+def _delete_group(conn, group_id):
+    conn.execute("DELETE FROM members WHERE group_id = ?", (group_id,))
+    conn.execute("DELETE FROM groups WHERE group_id = ?", (group_id,))
+    conn.execute("DELETE FROM roster_changes WHERE group_id = ?", (group_id,))
+    conn.execute("DELETE FROM roster_staging WHERE group_id = ?", (group_id,))
+    conn.execute("DELETE FROM crawl_leases WHERE group_id = ?", (group_id,))
+
+def _untrack(group_id):
+    conn = connect()
+    try:
+        with conn:
+            _delete_group(conn, group_id)
+    finally:
+        conn.close()
+
+def _purge_unused(cutoff):
+    # Drops groups last used before cutoff; returns their ids. The check and
+    # the deletes share one write transaction, so a concurrent query keeps its group.
+    conn = connect()
+    try:
+        with immediate(conn):
+            group_ids = [row[0] for row in conn.execute("SELECT group_id FROM groups WHERE last_used_at < ?", (cutoff,))]
+            for group_id in group_ids:
+                _delete_group(conn, group_id)
+    finally:
+        conn.close()
+    return group_ids
+
+# --- Async API ---
+
+async def crawl_and_save(group_id):
+    # At most one crawl per group across all processes, guarded by a lease row.
+    # A crawl that fails midway keeps its staged pages and stores the failed
+    # cursor, so the next crawl of the group resumes from there.
+    waiting_since = time.time()
+    while True:
+        lease = await asyncio.to_thread(_acquire_lease, group_id)
+        if lease is not None:
+            break
+        # Another process is crawling this group; its result serves this call too
+        await asyncio.sleep(LEASE_POLL)
+        refreshed_at = await asyncio.to_thread(_refreshed_at, group_id)
+        if refreshed_at is not None and refreshed_at >= waiting_since:
+            return refreshed_at
+    crawl_id, cursor = lease
+    lost_lease = f"Crawl of group {group_id} was taken over by another process"
+    rows = []
+    try:
+        async for page in roblox.iter_group_member_pages(group_id, cursor):
+            rows.extend(page)
+            if len(rows) >= STAGE_BATCH:
+                if not await asyncio.to_thread(_stage_rows, group_id, crawl_id, rows):
+                    return lost_lease
+                rows = []
+        if not await asyncio.to_thread(_stage_rows, group_id, crawl_id, rows):
+            return lost_lease
+    except roblox.RobloxAPIError as e:
+        if await asyncio.to_thread(_stage_rows, group_id, crawl_id, rows):
+            await asyncio.to_thread(_release_lease, group_id, crawl_id, e.cursor)
+        return str(e)
+    except Exception as e:
+        await asyncio.to_thread(_release_lease, group_id, crawl_id, None)
+        return f"Network or other error fetching group {group_id}: {e}"
+    refreshed_at = await asyncio.to_thread(_promote_staging, group_id, crawl_id)
+    return lost_lease if refreshed_at is None else refreshed_at
+
+async def refresh_roster(group_id):
+    # Returns the refresh timestamp, or an error string; concurrent refreshes share one crawl
+    task = _refreshing.get(group_id)
+    if task is None:
+        task = asyncio.ensure_future(crawl_pool.run(crawl_and_save, group_id))
+        _refreshing[group_id] = task
+        task.add_done_callback(lambda t: _refreshing.pop(group_id, None))
+    return await asyncio.shield(task)
+
+async def ensure_roster(group_id):
+    # Crawls untracked groups once; stale rosters are served as-is and refreshed in the background
+    refreshed_at = await asyncio.to_thread(_mark_used, group_id)
+    if refreshed_at is None:
+        return await refresh_roster(group_id)
+    if time.time() - refreshed_at > STALE_AFTER and group_id not in _refreshing:
+        ratelimit.background_task(refresh_roster(group_id))
+    return refreshed_at
+
+async def intersect(group_id_1, group_id_2):
+    # List of (username, rank_name_1, rank_num_1, rank_name_2, rank_num_2)
+    return await asyncio.to_thread(_intersect, group_id_1, group_id_2)
+
+async def overlap(group_ids, min_groups=2):
+    # (matrix, members): matrix[i][j] is the overlap of group_ids[i] and
+    # group_ids[j]; members is a list of (username, [(group_id, rank_name, rank_num)])
+    return await asyncio.to_thread(_overlap, list(group_ids), min_groups)
+
+async def changes_since(group_id, since):
+    # Every roster diff recorded after `since`, oldest first, read a page at a time
+    changes = []
+    after_rowid = 0
+    while True:
+        page = await asyncio.to_thread(_changes_since, group_id, since, after_rowid, CHANGE_PAGE)
+        changes.extend(row[1:] for row in page)
+        if len(page) < CHANGE_PAGE:
+            return changes
+        after_rowid = page[-1][0]
+
+async def mark_used(group_id):
+    # Keeps a group tracked without reading it, for callers that only refresh it
+    await asyncio.to_thread(_mark_used, group_id)
+
+async def member_count(group_id):
+    return await asyncio.to_thread(_member_count, group_id)
+
+async def untrack_group(group_id):
+    await asyncio.to_thread(_untrack, group_id)
+
+async def refresh_loop():
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            for group_id in await asyncio.to_thread(_purge_unused, time.time() - UNUSED_AFTER):
+                print(f"Stopped tracking group {group_id}: unused for {UNUSED_AFTER // 86400} days")
+            for group_id in await asyncio.to_thread(_stale_groups, time.time() - STALE_AFTER):
+                result = await refresh_roster(group_id)
+                if isinstance(result, str):
+                    print(f"Roster refresh error for group {group_id}: {result}")  # Log for debugging
+        except Exception as e:
+            print(f"Roster refresh loop error: {e}")  # Log for debugging
+
+def start_refresher():
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = ratelimit.background_task(refresh_loop())
+    return _refresher
@@ -0,0 +1,95 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Vectorized risk scoring. Weights and thresholds come from risk_config.json
+# (or RISK_CONFIG_PATH); a batch of feature records is scored in one pass.
+CONFIG_PATH = os.environ.get("RISK_CONFIG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_config.json"))
+
+FEATURES = ("account_age_days", "friends_count", "followers_count", "following_count", "total_badges", "badge_rate")
+LEVELS = ("Low", "Medium", "High")
+
+OPS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+
+class RiskModel:
+    def __init__(self, config):
+        factors = config["factors"]
+        for factor in factors:
+            if factor["feature"] not in FEATURES or factor["op"] not in OPS:
+                raise ValueError(f"Invalid risk factor: {factor}")
+        self.labels = [factor["label"] for factor in factors]
+        self.ops = [OPS[factor["op"]] for factor in factors]
+        self.columns = np.array([FEATURES.index(factor["feature"]) for factor in factors], dtype=np.intp)
+        self.thresholds = np.array([factor["threshold"] for factor in factors], dtype=float)
+        self.weights = np.array([factor["weight"] for factor in factors], dtype=float)
+        self.medium = config["levels"]["medium"]
+        self.high = config["levels"]["high"]
+        self.commonality_medium = config["commonality_levels"]["medium"]
+        self.commonality_high = config["commonality_levels"]["high"]
+        self.badge_rate_window = timedelta(days=config.get("badge_rate_window_days", 30))
+
+    def feature_matrix(self, records):
+        # Missing or "Unknown" features become NaN, which never trips a factor
+        matrix = np.full((len(records), len(FEATURES)), np.nan)
+        for row, record in enumerate(records):
+            for column, feature in enumerate(FEATURES):
+                value = record.get(feature)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    matrix[row, column] = value
+        return matrix
+
+    def score(self, records):
+        # Returns (scores, level indexes, factor hit matrix) for the whole batch
+        values = self.feature_matrix(records)[:, self.columns]
+        hits = np.zeros(values.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            for k, op in enumerate(self.ops):
+                hits[:, k] = op(values[:, k], self.thresholds[k])
+        scores = hits @ self.weights
+        levels = np.where(scores >= self.high, 2, np.where(scores >= self.medium, 1, 0))
+        return scores, levels, hits
+
+    def explain(self, records):
+        # Per-record score, level and the labels of the factors that fired
+        if not records:
+            return []
+        scores, levels, hits = self.score(records)
+        results = []
+        for row in range(len(records)):
+            fired = np.flatnonzero(hits[row])
+            results.append({
+                "risk_score": float(scores[row]),
+                "risk_level": LEVELS[levels[row]],
+                "risk_factors": [self.labels[k] for k in fired],
+                "contributions": {self.labels[k]: float(self.weights[k]) for k in fired},
+            })
+        return results
+
+    def commonality_threat(self, score):
+        return "High" if score >= self.commonality_high else "Medium" if score >= self.commonality_medium else "Low"
+
+    def uses(self, feature):
+        return any(FEATURES[column] == feature for column in self.columns)
+
+    def badge_stop_at(self):
+        # Badge count past which no factor can change, or None if only the full
+        # badge list will do (badge_rate needs every award date)
+        if self.uses("badge_rate"):
+            return None
+        factors = [(op, threshold) for op, threshold, column in zip(self.ops, self.thresholds, self.columns)
+                   if FEATURES[column] == "total_badges"]
+        if any(op not in (np.less, np.less_equal) for op, _ in factors):
+            return None
+        return int(max((threshold for _, threshold in factors), default=0)) + 1
+
+    def badge_rate(self, badges, now=None):
+        # Badges awarded within the configured window, from {name, date} records
+        cutoff = (now or datetime.now(timezone.utc)) - self.badge_rate_window
+        return sum(1 for badge in badges if badge["date"] and badge["date"] >= cutoff)
+
+def load_model(path=CONFIG_PATH):
+    with open(path) as f:
+        return RiskModel(json.load(f))
+
+model = load_model()
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+import aiohttp
+
+# Multi-process launcher: runs main.py once per process, each with a slice
+# of the shards. The processes share the roster store and the Roblox
+# shared cache, and split the Roblox rate limits between them.
+# Usage: SHARD_COUNT=8 SHARD_PROCESSES=4 python sharded.py
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT") or 0)  # 0: Discord's recommendation
+SHARD_PROCESSES = int(os.environ.get("SHARD_PROCESSES") or os.cpu_count() or 1)
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS") or 0)
+SHARED_CACHE_PATH = os.environ.get("ISB_SHARED_CACHE_PATH", "isb-cache.sqlite3")
+IDENTIFY_STAGGER = 5  # seconds between process starts, for Discord's identify limit
+
+async def recommended_shards(token):
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+def process_env(index, shard_ids, shard_count, processes):
+    env = dict(os.environ)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    env["ISB_SHARED_CACHE_PATH"] = SHARED_CACHE_PATH
+    env["ROBLOX_RATE_SHARE"] = str(1 / (processes * (1 + CRAWL_WORKERS)))
+    if os.environ.get("METRICS_PORT"):
+        env["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + index)
+    return env
+
+def main():
+    shard_count = SHARD_COUNT or asyncio.run(recommended_shards(os.environ["TOKEN"]))
+    processes = max(min(SHARD_PROCESSES, shard_count), 1)
+    children = []
+
+    def stop(signum=None, frame=None):
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for index in range(processes):
+            shard_ids = list(range(index, shard_count, processes))
+            print(f"Starting process {index} with shards {shard_ids} of {shard_count}")
+            children.append(subprocess.Popen([sys.executable, "main.py"], env=process_env(index, shard_ids, shard_count, processes)))
+            if index < processes - 1:
+                time.sleep(IDENTIFY_STAGGER)
+        # One process exiting takes the rest down, so the dyno restarts as a whole
+        while all(child.poll() is None for child in children):
+            time.sleep(1)
+    finally:
+        stop()
+        for child in children:
+            child.wait()
+    return next((child.returncode for child in children if child.returncode), 0)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import time
+import metrics
+
+# Cross-process second level behind roblox.cache. Shard processes and crawl
+# workers pointed at the same file reuse each other's Roblox fetches; rosters
+# are shared through roster_store's database instead. Off unless
+# ISB_SHARED_CACHE_PATH is set.
+SHARED_CACHE_PATH = os.environ.get("ISB_SHARED_CACHE_PATH")
+KINDS = {"profile", "counts", "badges", "groups", "friends"}
+PURGE_INTERVAL = 10 * 60  # seconds between sweeps of expired rows
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+"""
+
+_initialized = False
+_purged_at = 0.0
+
+def enabled(kind):
+    return SHARED_CACHE_PATH is not None and kind in KINDS
+
+def connect():
+    global _initialized
+    conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _initialized = True
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+# --- Blocking helpers (run via asyncio.to_thread) ---
+
+def _get(kind, key):
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT value FROM cache WHERE kind = ? AND key = ? AND expires_at > ?",
+            (kind, str(key), time.time())
+        ).fetchone()
+    finally:
+        conn.close()
+    return pickle.loads(row[0]) if row else None
+
+def _set(kind, key, value, ttl):
+    global _purged_at
+    now = time.time()
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (kind, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                (kind, str(key), now + ttl, pickle.dumps(value))
+            )
+            if now - _purged_at > PURGE_INTERVAL:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                _purged_at = now
+    finally:
+        conn.close()
+
+# --- Async API ---
+
+def through(kind, key, ttl, fetch, should_cache):
+    # Wraps fetch so an in-process miss checks the shared file before Roblox
+    async def fetch_shared():
+        try:
+            value = await asyncio.to_thread(_get, kind, key)
+        except Exception as e:
+            print(f"Shared cache read error: {e}")  # Log for debugging
+            value = None
+        metrics.inc("isb_shared_cache_total", kind=kind, result="miss" if value is None else "hit")
+        if value is not None:
+            return value
+        value = await fetch()
+        if should_cache(value):
+            try:
+                await asyncio.to_thread(_set, kind, key, value, ttl)
+            except Exception as e:
+                print(f"Shared cache write error: {e}")  # Log for debugging
+        return value
+    return fetch_shared
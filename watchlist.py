@@ -0,0 +1,230 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import ratelimit
+import roblox
+import roster_store
+
+# Scheduled watchlist of Roblox users and groups. One shared scheduler polls
+# due entries under a request budget, diffs compact snapshots and hands only
+# the changes to the notify callback. State is persisted to STATE_PATH.
+STATE_PATH = os.environ.get("WATCHLIST_PATH", "watchlist.json")
+REQUEST_BUDGET_PER_HOUR = 2000  # Roblox requests the watchlist may spend per hour
+BUDGET_BURST = 500  # most requests one tick may spend
+TICK = 30  # seconds between scheduler passes
+USER_INTERVAL = 30 * 60
+GROUP_INTERVAL = 2 * 60 * 60
+JITTER = 0.2
+POLL_CONCURRENCY = 4
+MAX_NEW_BADGES = 5
+
+state = {"channel_id": None, "users": {}, "groups": {}}
+_budget = BUDGET_BURST
+_budget_at = time.monotonic()
+_scheduler = None
+_notify = None
+
+def jittered(interval):
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+# --- State ---
+
+def _read_state():
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Watchlist state load error: {e}")  # Log for debugging
+        return None
+
+def load_state():
+    global state
+    loaded = _read_state()
+    if loaded is not None:
+        state = {"channel_id": loaded.get("channel_id"), "users": loaded.get("users", {}), "groups": loaded.get("groups", {})}
+
+async def reload_state():
+    # Picks up edits saved by other processes (shards). The process running the
+    # scheduler keeps its own, fresher snapshots and due times for entries that
+    # are still listed; any other process takes the file as is.
+    loaded = await asyncio.to_thread(_read_state)
+    if loaded is None:
+        return
+    state["channel_id"] = loaded.get("channel_id")
+    for kind in ("users", "groups"):
+        on_disk = loaded.get(kind, {})
+        if _scheduler is None:
+            state[kind] = on_disk
+        else:
+            state[kind] = {item_id: state[kind].get(item_id, entry) for item_id, entry in on_disk.items()}
+
+def _write_state(data):
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, STATE_PATH)
+
+async def save_state():
+    await asyncio.to_thread(_write_state, json.dumps(state))
+
+def set_channel(channel_id):
+    state["channel_id"] = channel_id
+
+def add_user(user_id):
+    # Returns False if already watched; the first poll only records a baseline
+    if str(user_id) in state["users"]:
+        return False
+    state["users"][str(user_id)] = {"snapshot": None, "next_due": 0}
+    return True
+
+def add_group(group_id):
+    if str(group_id) in state["groups"]:
+        return False
+    state["groups"][str(group_id)] = {"since": None, "next_due": 0}
+    return True
+
+def remove_user(user_id):
+    return state["users"].pop(str(user_id), None) is not None
+
+def remove_group(group_id):
+    return state["groups"].pop(str(group_id), None) is not None
+
+# --- Snapshots and diffs ---
+
+def diff_user(old, new, badges):
+    lines = []
+    old_groups, new_groups = old["groups"], new["groups"]
+    for group_id, (name, rank, rank_num) in new_groups.items():
+        previous = old_groups.get(group_id)
+        if previous is None:
+            lines.append(f"Joined **{name}** ({group_id}) as {rank} ({rank_num})")
+        elif previous[2] != rank_num:
+            lines.append(f"Rank in **{name}** ({group_id}): {previous[1]} ({previous[2]}) -> {rank} ({rank_num})")
+    for group_id, (name, rank, rank_num) in old_groups.items():
+        if group_id not in new_groups:
+            lines.append(f"Left **{name}** ({group_id})")
+    if new["badges"] != old["badges"]:
+        delta = new["badges"] - old["badges"]
+        lines.append(f"Badges: {old['badges']} -> {new['badges']} ({delta:+d})")
+        recent = [b["name"] for b in badges if b["date"] and b["date"].timestamp() > old["taken_at"]]
+        if recent:
+            lines.append("New badges: " + ", ".join(recent[-MAX_NEW_BADGES:]))
+    return lines
+
+async def poll_user(user_id, entry):
+    # Uses the uncached fetchers so every poll sees fresh data
+    groups, badges = await asyncio.gather(roblox.fetch_user_groups(user_id), roblox.fetch_user_badges_full(user_id))
+    if isinstance(groups, str):
+        raise roblox.RobloxAPIError(groups)
+    if isinstance(badges, str):
+        raise roblox.RobloxAPIError(badges)
+    snapshot = {
+        "groups": {str(g["id"]): [g["name"], g["rank"], g["rank_num"]] for g in groups},
+        "badges": len(badges),
+        "taken_at": time.time(),
+    }
+    old = entry["snapshot"]
+    entry["snapshot"] = snapshot
+    return diff_user(old, snapshot, badges) if old else []
+
+def format_roster_change(change):
+    changed_at, user_id, username, kind, old_rank_name, old_rank_num, new_rank_name, new_rank_num = change
+    if kind == "joined":
+        return f"**{username}** ({user_id}) joined as {new_rank_name} ({new_rank_num})"
+    if kind == "left":
+        return f"**{username}** ({user_id}) left, was {old_rank_name} ({old_rank_num})"
+    return f"**{username}** ({user_id}): {old_rank_name} ({old_rank_num}) -> {new_rank_name} ({new_rank_num})"
+
+async def poll_group(group_id, entry):
+    # Roster diffs are recorded by the roster store on every refresh; polling
+    # counts as use, so watched groups are never dropped as unused
+    await roster_store.mark_used(group_id)
+    refreshed_at = await roster_store.refresh_roster(group_id)
+    if isinstance(refreshed_at, str):
+        raise roblox.RobloxAPIError(refreshed_at)
+    since = entry["since"]
+    entry["since"] = refreshed_at
+    if since is None:
+        return []
+    return [format_roster_change(change) for change in await roster_store.changes_since(group_id, since)]
+
+# --- Scheduler ---
+
+async def estimated_cost(kind, item_id, entry):
+    if kind == "user":
+        snapshot = entry["snapshot"]
+        badge_pages = math.ceil(snapshot["badges"] / 100) if snapshot else 2
+        return 1 + max(badge_pages, 1)
+    member_count = await roster_store.member_count(int(item_id))
+    return max(math.ceil(member_count / 100), 1) if member_count else 10
+
+def refill_budget():
+    global _budget, _budget_at
+    now = time.monotonic()
+    _budget = min(BUDGET_BURST, _budget + (now - _budget_at) * REQUEST_BUDGET_PER_HOUR / 3600)
+    _budget_at = now
+
+async def tick():
+    global _budget
+    await reload_state()
+    refill_budget()
+    now = time.time()
+    due = [("user", item_id, entry) for item_id, entry in state["users"].items() if entry["next_due"] <= now]
+    due += [("group", item_id, entry) for item_id, entry in state["groups"].items() if entry["next_due"] <= now]
+    due.sort(key=lambda item: item[2]["next_due"])
+    selected = []
+    for kind, item_id, entry in due:
+        cost = await estimated_cost(kind, item_id, entry)
+        # Entries larger than one burst run once the budget is full and leave it
+        # in debt, so later ticks wait for the hourly rate to pay the excess back
+        affordable = cost <= _budget or (not selected and _budget >= BUDGET_BURST)
+        if not affordable:
+            break
+        _budget -= cost
+        selected.append((kind, item_id, entry))
+    if not selected:
+        return
+    semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+
+    async def run(kind, item_id, entry):
+        async with semaphore:
+            try:
+                poll = poll_user if kind == "user" else poll_group
+                lines = await poll(int(item_id), entry)
+                entry["next_due"] = time.time() + jittered(USER_INTERVAL if kind == "user" else GROUP_INTERVAL)
+            except Exception as e:
+                print(f"Watchlist poll error for {kind} {item_id}: {e}")  # Log for debugging
+                entry["next_due"] = time.time() + jittered(TICK * 10)
+                return
+            if lines and _notify is not None and state["channel_id"]:
+                title = f"Watchlist: {'User' if kind == 'user' else 'Group'} {item_id}"
+                try:
+                    await _notify(state["channel_id"], title, lines)
+                except Exception as e:
+                    print(f"Watchlist notify error: {e}")  # Log for debugging
+
+    await asyncio.gather(*(run(*item) for item in selected))
+    await reload_state()
+    await save_state()
+
+async def run_scheduler():
+    while True:
+        try:
+            await tick()
+        except Exception as e:
+            print(f"Watchlist scheduler error: {e}")  # Log for debugging
+        await asyncio.sleep(jittered(TICK))
+
+def start(notify):
+    # notify(channel_id, title, lines) posts a change report
+    global _scheduler, _notify
+    _notify = notify
+    if _scheduler is None or _scheduler.done():
+        load_state()
+        _scheduler = ratelimit.background_task(run_scheduler())
+    return _scheduler